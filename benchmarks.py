@@ -0,0 +1,478 @@
+"""
+Benchmarks for the per-frame game code
+
+Run with: python benchmarks.py [--json FILE] [--replays FILE...]
+Nothing here needs a display, the canvas is replaced with a stand-in.
+
+The tick benchmarks drive the real GUI.tick against a RecordingCanvas, which
+counts the drawing calls instead of drawing. They play a fixed replay of every
+level, any recorded replays given, and stress chunks that keep 10, 100 and
+1000 obstacles on screen. Each is reported as ticks per second, drawing calls
+per tick, memory blocks retained per tick (the change in
+sys.getallocatedblocks, there to catch ticks that keep memory, and clamped at
+0 as freeing something from before the run makes it negative) and peak bytes
+per tick (the most memory a tick and its frame have allocated at once, freed
+again or not). The peaks are measured with tracemalloc in a second, untimed
+run, as tracing slows everything down. The results are saved as JSON so runs
+can be compared over time.
+"""
+
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+from sineplane_constants import *
+from simulation import *
+from sinewave import SinWave, SIN_PHASE_ONE
+from sineplane import GUI
+from scheduler import QualityController
+from replay import Replay, start_replay
+
+BENCHMARK_RESULTS_PATH = "benchmark_results.json"
+
+# Seed for the inputs of the level replays, changing it makes old results incomparable
+LEVEL_REPLAY_SEED = 0
+
+# Live obstacles kept on screen by the stress chunks
+STRESS_LIVE_OBSTACLES = (10, 100, 1000)
+STRESS_TICKS = 500 # Ticks timed for each stress chunk, after it has filled the screen
+
+
+class NullCanvas:
+    """Stand-in canvas that accepts the drawing calls and does nothing with them"""
+    def create_line(self, *args, **kwargs):
+        return 1
+    
+    def coords(self, *args):
+        pass
+    
+    
+class RecordingCanvas:
+    """Stand-in canvas for the game screen that counts the drawing calls made on it"""
+    def __init__(self):
+        self.calls = {}
+        self.next_item = 1
+        
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        
+    def create_item(self, name):
+        self.count(name)
+        self.next_item += 1
+        return self.next_item - 1
+        
+    def create_line(self, *args, **kwargs):
+        return self.create_item("create_line")
+    
+    def create_rectangle(self, *args, **kwargs):
+        return self.create_item("create_rectangle")
+    
+    def create_text(self, *args, **kwargs):
+        return self.create_item("create_text")
+    
+    def create_window(self, *args, **kwargs):
+        return self.create_item("create_window")
+    
+    def coords(self, *args):
+        self.count("coords")
+        
+    def move(self, *args):
+        self.count("move")
+        
+    def delete(self, *args):
+        self.count("delete")
+        
+    def itemconfigure(self, *args, **kwargs):
+        self.count("itemconfigure")
+        
+    def tag_lower(self, *args):
+        self.count("tag_lower")
+        
+    def tag_raise(self, *args):
+        self.count("tag_raise")
+        
+    def update_idletasks(self):
+        self.count("update_idletasks")
+        
+        
+class BenchGUI(GUI):
+    """
+    The game screen of the GUI without a window: only what GUI.tick needs is
+    set up, and it draws on a RecordingCanvas
+    """
+    def __init__(self, sim):
+        """
+        Keyword Arguments:
+            sim -- the Simulation to run
+        """
+        self.sim = sim
+        self.canvas = RecordingCanvas()
+        self.level_buttons = [LevelSelectButtonState() for i in range(len(sim.levels))]
+        self.finished_game = False
+        self.left = False
+        self.right = False
+        self.replay = None
+        self.playback = None
+        self.frame_stats = None
+        self.show_hud = False
+        # Left at full quality, as there is no scheduler to change it
+        self.quality = QualityController(QUALITY_FRAME_TICKS, QUALITY_OVERRUN_LOAD, QUALITY_HEADROOM_LOAD,
+                                         QUALITY_SETTLE_TICKS, QUALITY_RESTORE_TICKS)
+        self.reset_canvas_items()
+        
+    def main_screen(self, event=None):
+        pass
+    
+    
+class LevelSelectButtonState:
+    """Stand-in for a level select button, only whether it is unlocked is used"""
+    unlocked = False
+    
+    
+class LegacySinDrawer:
+    """The old eval based draw_sin, kept here as the baseline to compare against"""
+    def __init__(self, sin):
+        self.sin = sin
+        self.canvas = NullCanvas()
+        
+    def draw_sin(self):
+        xcoord = PLANE_STARTING_X
+        iterations = 1      
+            
+        for i in range(4):
+            temp_string = "self.canvas.create_line(PLANE_STARTING_X + {0} * SIN_PLOT_POINT_DISTANCE, WINDOW_HEIGHT/2 + SIN_AMPLITUDE*math.sin(self.sin.angle + {0} * SIN_PLOT_POINT_DISTANCE/self.sin.period*2*math.pi), ".format(iterations - 1)
+            
+            while xcoord < WINDOW_WIDTH/4 * (i + 1):
+                temp_string = temp_string + "PLANE_STARTING_X + {0} * SIN_PLOT_POINT_DISTANCE, WINDOW_HEIGHT/2 + SIN_AMPLITUDE*math.sin(self.sin.angle + {0} * SIN_PLOT_POINT_DISTANCE/self.sin.period*2*math.pi), ".format(iterations)
+                iterations += 1
+                xcoord += SIN_PLOT_POINT_DISTANCE
+                
+            temp_string = temp_string + "fill = SIN_COLOR)"
+            
+            eval(temp_string)
+            
+
+def per_frame(function, repeats=5, number=500):
+    """
+    Returns the best time for a single call of function, in seconds
+    Keyword Arguments:
+        function -- the function to time
+        repeats -- the number of timing runs, the fastest is used
+        number -- the number of calls in each timing run
+    """
+    return min(timeit.repeat(function, repeat=repeats, number=number)) / number
+
+
+def bench_draw_sin():
+    """
+    Compares the old eval based sin drawing with the table based SinWave.plot_coords,
+    and with the coarser lines drawn when the quality is cut back
+    """
+    sin = SinWave()
+    sin.phase = round(1.234 / (2 * math.pi) * SIN_PHASE_ONE)
+    sin.exponent = 3
+    canvas = NullCanvas()
+    
+    legacy = per_frame(LegacySinDrawer(sin).draw_sin)
+    current = per_frame(lambda: canvas.coords(1, sin.plot_coords()))
+    
+    print("draw_sin (eval, 4 lines):        {:8.1f}us per frame".format(legacy * 1e6))
+    print("draw_sin (plot_coords, 1 line):  {:8.1f}us per frame".format(current * 1e6))
+    print("speedup: {:.1f}x".format(legacy / current))
+    for stride in sorted(set(QUALITY_SIN_STRIDES))[1:]:
+        coarse = per_frame(lambda: canvas.coords(1, sin.plot_coords(stride=stride)))
+        print("draw_sin (every {} points):      {:8.1f}us per frame".format(stride, coarse * 1e6))
+    
+    
+class ImmortalSimulation(Simulation):
+    """A simulation where the plane never hits anything, so a run goes on forever"""
+    def find_collision(self):
+        return None
+    
+    
+def record_level_replays(easy, medium, hard, levels, seed=LEVEL_REPLAY_SEED):
+    """
+    Returns a fixed replay of every level, played to the end by an
+    ImmortalSimulation with seeded random inputs
+    Keyword Arguments:
+        easy, medium, hard, levels -- the chunk pools and levels
+        seed -- the seed for the inputs
+    """
+    rng = random.Random(seed)
+    replays = []
+    for level_index in range(len(levels)):
+        sim = ImmortalSimulation(easy, medium, hard, levels)
+        sim.start_level(level_index)
+        replay = Replay.start(sim)
+        while not sim.complete:
+            # Holds a key for a few ticks at a time, like a player would
+            if replay.ticks % 8 == 0:
+                keys = rng.choice(((False, False), (False, False), (True, False), (False, True)))
+            replay.record(*keys)
+            sim.step(*keys)
+        replays.append(replay)
+    return replays
+
+
+def stress_level(live, seed=0):
+    """
+    Returns a Level whose chunks keep about live obstacles on screen
+    Keyword Arguments:
+        live -- the number of obstacles to keep on screen
+        seed -- the seed for the obstacles' positions
+    """
+    rng = random.Random(seed)
+    width = 20
+    # Ticks an obstacle is on screen for
+    lifetime = math.ceil((WINDOW_WIDTH + width) / MOVESPEED)
+    chunk = LevelChunk()
+    count = round(live * (chunk.length - 1) / lifetime)
+    for i in range(count):
+        height = rng.randint(20, 60)
+        chunk.add_signal(1 + i * (chunk.length - 1) // count, WINDOW_WIDTH, rng.randint(0, WINDOW_HEIGHT - height), width, height)
+    return Level([chunk] * 1000, "{} obstacles".format(live))
+
+
+def run_ticks(gui, ticks=None):
+    """
+    Runs GUI.tick, drawing one frame after each, until the run ends (or for a
+    number of ticks) and returns the result as a dict
+    Keyword Arguments:
+        gui -- the BenchGUI
+        ticks -- the most ticks to run, None to run until the run ends
+    """
+    gui.canvas.calls = {}
+    sim = gui.sim
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    ran = 0
+    t = time.perf_counter()
+    while not (sim.dead or sim.complete) and ran != ticks:
+        gui.tick()
+        gui.render(1.0)
+        ran += 1
+    elapsed = time.perf_counter() - t
+    blocks = sys.getallocatedblocks() - blocks
+    
+    return {"ticks": ran,
+            "ticks_per_second": ran / elapsed,
+            "us_per_tick": elapsed / ran * 1e6,
+            "retained_blocks_per_tick": max(0, blocks) / ran,
+            "live_obstacles": len(sim.obstacles),
+            "draw_calls_per_tick": {name: count / ran for name, count in sorted(gui.canvas.calls.items())}}
+
+
+def peak_bytes(function, calls):
+    """
+    Calls a function repeatedly under tracemalloc and returns the mean of the
+    most memory each call had allocated at once, whether it was freed or not
+    Keyword Arguments:
+        function -- the function to call, returns False once there is nothing left to run
+        calls -- the most calls to make
+    """
+    total = 0
+    made = 0
+    tracemalloc.start()
+    while made != calls:
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        if function() is False:
+            break
+        total += tracemalloc.get_traced_memory()[1] - start
+        made += 1
+    tracemalloc.stop()
+    return total / made if made else 0.0
+
+
+def traced_ticks(gui, ticks=None):
+    """
+    Runs GUI.tick like run_ticks, but under tracemalloc, and returns the mean
+    peak bytes allocated per tick (with its frame)
+    Keyword Arguments:
+        gui -- the BenchGUI
+        ticks -- the most ticks to run, None to run until the run ends
+    """
+    sim = gui.sim
+    
+    def tick():
+        if sim.dead or sim.complete:
+            return False
+        gui.tick()
+        gui.render(1.0)
+    return peak_bytes(tick, ticks)
+
+
+def bench_level_replays(easy, medium, hard, levels, replays, immortal):
+    """
+    Plays replays through GUI.tick and returns the results by name
+    Keyword Arguments:
+        easy, medium, hard, levels -- the chunk pools and levels
+        replays -- (name, Replay) pairs
+        immortal -- True to play them with an ImmortalSimulation
+    """
+    def replay_gui(replay):
+        sim = (ImmortalSimulation if immortal else Simulation)(easy, medium, hard, levels)
+        gui = BenchGUI(sim)
+        start_replay(sim, replay)
+        gui.playback = iter(replay)
+        return gui
+    
+    results = {}
+    for name, replay in replays:
+        results[name] = run_ticks(replay_gui(replay))
+        results[name]["peak_bytes_per_tick"] = traced_ticks(replay_gui(replay))
+    return results
+
+
+def bench_stress(easy, medium, hard, live, ticks=STRESS_TICKS):
+    """
+    Runs GUI.tick with a stress chunk on screen and returns the result
+    Keyword Arguments:
+        easy, medium, hard -- the chunk pools
+        live -- the number of obstacles to keep on screen
+        ticks -- the number of ticks to time
+    """
+    def stress_gui():
+        sim = ImmortalSimulation(easy, medium, hard, [stress_level(live)])
+        sim.start_level(0)
+        gui = BenchGUI(sim)
+        # Recorded like a real run
+        gui.replay = Replay(0, 0, sim.sin.phase, sim.sin.exponent, 0)
+        # Fills the screen before timing
+        run_ticks(gui, TITLE_TICKS + math.ceil(WINDOW_WIDTH / MOVESPEED) + 10)
+        return gui
+    
+    result = run_ticks(stress_gui(), ticks)
+    result["peak_bytes_per_tick"] = traced_ticks(stress_gui(), ticks)
+    return result
+
+
+def per_call(function, number=2000):
+    """
+    Returns the time, the memory blocks retained and the peak bytes allocated
+    for one call of function, as a dict
+    Keyword Arguments:
+        function -- the function to time
+        number -- the number of calls to time
+    """
+    seconds = per_frame(function, number=number)
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    for i in range(number):
+        function()
+    blocks = sys.getallocatedblocks() - blocks
+    return {"us_per_call": seconds * 1e6, "retained_blocks_per_call": max(0, blocks) / number,
+            "peak_bytes_per_call": peak_bytes(function, number)}
+
+
+def bench_calls(easy, medium, hard, levels):
+    """Times the functions called every tick on their own, returns the results by name"""
+    sim = Simulation(easy, medium, hard, levels)
+    sim.start_level(0)
+    gui = BenchGUI(sim)
+    gui.sin_item = gui.canvas.create_line(0, 0, 0, 0)
+    obstacle = Obstacle(PLANE_STARTING_X, 0, 40, 100)
+    return {"draw_sin": per_call(gui.draw_sin),
+            "calculate_sin": per_call(lambda: sim.calculate_sin(False, False)),
+            "intersects_with": per_call(lambda: obstacle.intersects_with(sim.plane)),
+            "find_collision": per_call(sim.find_collision)}
+
+
+def print_results(title, results):
+    """
+    Prints benchmark results as a table
+    Keyword Arguments:
+        title -- the heading
+        results -- the results by name
+    """
+    print(title)
+    for name, result in results.items():
+        if "ticks_per_second" in result:
+            print("  {:32}{:10.0f} ticks/s {:8.1f}us/tick {:6.2f} retained blocks/tick {:8.0f} peak bytes/tick {:7.1f} draw calls/tick".format(
+                name, result["ticks_per_second"], result["us_per_tick"], result["retained_blocks_per_tick"],
+                result["peak_bytes_per_tick"], sum(result["draw_calls_per_tick"].values())))
+        else:
+            print("  {:32}{:8.2f}us/call {:6.2f} retained blocks/call {:8.0f} peak bytes/call".format(
+                name, result["us_per_call"], result["retained_blocks_per_call"], result["peak_bytes_per_call"]))
+
+
+def bench_ticks(replay_paths=(), json_path=BENCHMARK_RESULTS_PATH):
+    """
+    Runs the tick benchmarks, prints them and saves them as JSON
+    Keyword Arguments:
+        replay_paths -- recorded replay files to benchmark as well
+        json_path -- the file to save the results to
+    """
+    easy, medium, hard, levels = load_levels()
+    level_replays = [("{:02} {}".format(i + 1, levels.title(i)), replay)
+                     for i, replay in enumerate(record_level_replays(easy, medium, hard, levels))]
+    
+    results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "levels": bench_level_replays(easy, medium, hard, levels, level_replays, True),
+               "replays": bench_level_replays(easy, medium, hard, levels, [(path, Replay.load(path)) for path in replay_paths], False),
+               "stress": {"{} obstacles".format(live): bench_stress(easy, medium, hard, live) for live in STRESS_LIVE_OBSTACLES},
+               "calls": bench_calls(easy, medium, hard, levels)}
+    
+    print_results("level replays (GUI.tick, recording canvas):", results["levels"])
+    if replay_paths:
+        print_results("recorded replays:", results["replays"])
+    print_results("stress chunks:", results["stress"])
+    print_results("single calls:", results["calls"])
+    
+    with open(json_path, "w") as file:
+        json.dump(results, file, indent=4)
+    print("Results saved to {}".format(json_path))
+    
+    
+def bench_endless_soak(hours=1, seed=0):
+    """
+    Plays an endless run for hours of game time and checks the heap does not grow
+    Keyword Arguments:
+        hours -- how long a run to play, in game time
+        seed -- the seed for the order of chunks
+    """
+    easy, medium, hard, levels = load_levels()
+    sim = ImmortalSimulation(easy, medium, hard, levels)
+    sim.start_endless(seed)
+    
+    ticks = int(hours * 3600 * TICKS_PER_SECOND)
+    warm_up = ticks // 10
+    tracemalloc.start()
+    t = time.perf_counter()
+    for tick in range(ticks):
+        sim.step(False, False)
+        if tick == warm_up:
+            gc.collect()
+            start_heap = tracemalloc.get_traced_memory()[0]
+    elapsed = time.perf_counter() - t
+    gc.collect()
+    end_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    print("endless soak ({}h of play):      {:8.1f}us per tick".format(hours, elapsed / ticks * 1e6))
+    print("heap growth after warm up:       {:8d} bytes".format(end_heap - start_heap))
+    
+    
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the per-frame game code")
+    parser.add_argument("--json", default=BENCHMARK_RESULTS_PATH, help="file to save the tick results to (default: %(default)s)")
+    parser.add_argument("--replays", nargs="*", default=[], metavar="FILE", help="recorded replays to benchmark as well")
+    args = parser.parse_args()
+    
+    bench_draw_sin()
+    bench_endless_soak()
+    bench_ticks(args.replays, args.json)
+    return 0
+    
+    
+if __name__ == "__main__":
+    raise SystemExit(main())
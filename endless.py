@@ -0,0 +1,87 @@
+"""
+Endless mode: an unending stream of chunks that gets harder the longer the
+run goes on
+
+The stream is a pipeline of generators (difficulty -> chunk -> prefetch), so
+however long a run goes on, nothing is kept but the chunk being played and
+the few built ahead of it. Given an executor, the chunks ahead are picked and
+built on it while the current one plays, so starting a chunk only takes one
+that is already built.
+"""
+
+import random
+from collections import deque
+
+from sineplane_constants import *
+
+
+def difficulty_ramp(ramp=ENDLESS_RAMP):
+    """
+    Yields the (easy, medium, hard) weights to pick each chunk of a run with
+    Keyword Arguments:
+        ramp -- rows of (chunks played, easy, medium, hard weights), see ENDLESS_RAMP
+    """
+    stage = 0
+    played = 0
+    while True:
+        while stage + 1 < len(ramp) and played >= ramp[stage + 1][0]:
+            stage += 1
+        yield ramp[stage][1:]
+        played += 1
+        
+        
+def draw_chunks(pools, weights, rng):
+    """
+    Yields a chunk for each set of weights, from one of the pools picked with
+    those weights. The same chunk is never played twice in a row.
+    Keyword Arguments:
+        pools -- the easy, medium and hard chunk pools
+        weights -- an iterable of (easy, medium, hard) weights
+        rng -- the random.Random to pick with
+    """
+    last = None
+    for pool_weights in weights:
+        pool_index = rng.choices(range(len(pools)), pool_weights)[0]
+        pool = pools[pool_index]
+        chunk_index = rng.randrange(len(pool))
+        if (pool_index, chunk_index) == last and len(pool) > 1:
+            chunk_index = (chunk_index + rng.randrange(1, len(pool))) % len(pool)
+        last = (pool_index, chunk_index)
+        yield pool[chunk_index]
+        
+        
+def lookahead(items, executor, ahead=ENDLESS_PREFETCH):
+    """
+    Yields the same items, but has the next few taken from items on an
+    executor while each one is used. Chunks are built as they are taken, so
+    this has the next chunk built in the background while the current one is
+    played.
+    Keyword Arguments:
+        items -- the iterable to read ahead of
+        executor -- the executor to take items on, it must have one worker so items are taken in order
+        ahead -- how many items to take early
+    """
+    items = iter(items)
+    end = object()
+    queue = deque(executor.submit(next, items, end) for i in range(ahead + 1))
+    while True:
+        item = queue.popleft().result()
+        if item is end:
+            return
+        queue.append(executor.submit(next, items, end))
+        yield item
+        
+        
+def endless_chunks(easy_chunks, medium_chunks, hard_chunks, seed=None, executor=None):
+    """
+    Returns an endless iterator of the chunks to play in an endless run
+    Keyword Arguments:
+        easy_chunks, medium_chunks, hard_chunks -- the chunk pools
+        seed -- the seed for the order of chunks, None for a different run every time
+        executor -- the single worker executor to build chunks ahead on, None to build each one when it is played
+    """
+    pools = (easy_chunks, medium_chunks, hard_chunks)
+    chunks = draw_chunks(pools, difficulty_ramp(), random.Random(seed))
+    if executor is None:
+        return chunks
+    return lookahead(chunks, executor)
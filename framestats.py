@@ -0,0 +1,188 @@
+"""
+Timings of each part of a frame, for finding out why frames run over budget
+
+Each frame is split into phases (see PHASES), and how long each one takes is
+added to a RollingHistogram. A histogram only keeps counts in fixed buckets,
+for the last FRAME_STATS_WINDOW frames and for the whole session, so adding a
+time is a bisect and a few additions and nothing grows however long the game
+runs.
+"""
+
+import time
+from array import array
+from bisect import bisect_left
+
+from sineplane_constants import *
+
+# The phases of a frame, in the order they run
+SPAWN_PHASE = "spawn"
+MOVE_PHASE = "obstacle move"
+COLLISION_PHASE = "collision"
+SIN_PHASE = "calculate_sin"
+DRAW_OBSTACLES_PHASE = "obstacle draw"
+DRAW_SIN_PHASE = "draw_sin"
+DRAW_PLANE_PHASE = "plane draw"
+UPDATE_PHASE = "canvas update"
+PHASES = (SPAWN_PHASE, MOVE_PHASE, COLLISION_PHASE, SIN_PHASE,
+          DRAW_OBSTACLES_PHASE, DRAW_SIN_PHASE, DRAW_PLANE_PHASE, UPDATE_PHASE)
+
+# Upper edges of the histogram buckets in seconds: 4 to an octave from 1us to
+# about 1s, with one more bucket for anything longer
+BUCKETS_PER_OCTAVE = 4
+BUCKET_BOUNDS = [1e-6 * 2 ** (i / BUCKETS_PER_OCTAVE) for i in range(20 * BUCKETS_PER_OCTAVE + 1)]
+
+
+class RollingHistogram:
+    """Counts of times in buckets, for the last few samples and for all of them"""
+    def __init__(self, window=FRAME_STATS_WINDOW):
+        """
+        Keyword Arguments:
+            window -- the number of recent samples to keep counts for
+        """
+        self.window = window
+
+        # The last window samples, oldest first from position once it is full
+        self.recent = array("d", bytes(8 * window))
+        self.position = 0
+        self.filled = 0
+        self.recent_time = 0.0
+
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.totals = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.samples = 0
+        self.total_time = 0.0
+        self.longest = 0.0
+
+    def add(self, seconds):
+        """
+        Adds a sample
+        Keyword Arguments:
+            seconds -- the time taken
+        """
+        if self.filled == self.window:
+            old = self.recent[self.position]
+            self.counts[bisect_left(BUCKET_BOUNDS, old)] -= 1
+            self.recent_time -= old
+        else:
+            self.filled += 1
+        self.recent[self.position] = seconds
+        self.position = (self.position + 1) % self.window
+        self.recent_time += seconds
+
+        bucket = bisect_left(BUCKET_BOUNDS, seconds)
+        self.counts[bucket] += 1
+        self.totals[bucket] += 1
+        self.samples += 1
+        self.total_time += seconds
+        if seconds > self.longest:
+            self.longest = seconds
+
+    def recent_mean(self):
+        """Returns the mean of the recent samples"""
+        return self.recent_time / self.filled if self.filled else 0.0
+
+    def percentile(self, fraction, counts=None):
+        """
+        Returns the upper edge of the bucket a percentile of the samples falls in
+        Keyword Arguments:
+            fraction -- the percentile, 0.99 for p99
+            counts -- the bucket counts to use, the recent ones by default
+        """
+        if counts is None:
+            counts = self.counts
+        target = fraction * sum(counts)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else self.longest
+        return 0.0
+
+    def report(self):
+        """Returns the whole session's samples as a dict, for saving"""
+        return {"samples": self.samples,
+                "mean_ms": self.total_time / self.samples * 1000 if self.samples else 0.0,
+                "p50_ms": self.percentile(0.5, self.totals) * 1000,
+                "p90_ms": self.percentile(0.9, self.totals) * 1000,
+                "p99_ms": self.percentile(0.99, self.totals) * 1000,
+                "max_ms": self.longest * 1000,
+                "buckets": list(self.totals)}
+
+
+class FrameStats:
+    """
+    The timings of every frame. A frame is timed with start_frame, then mark
+    after each phase and end_frame at the end.
+    """
+    def __init__(self, window=FRAME_STATS_WINDOW):
+        """
+        Keyword Arguments:
+            window -- the number of recent frames the rolling figures cover
+        """
+        self.phases = {phase: RollingHistogram(window) for phase in PHASES}
+        self.frames = RollingHistogram(window)
+
+        # When the recent frames started, for working out the frame rate
+        self.starts = array("d", bytes(8 * window))
+        self.position = 0
+        self.filled = 0
+
+        self.frame_start = 0.0
+        self.last = 0.0
+
+    def start_frame(self):
+        """Starts timing a frame"""
+        self.frame_start = self.last = time.perf_counter()
+        self.starts[self.position] = self.frame_start
+        self.position = (self.position + 1) % len(self.starts)
+        self.filled = min(self.filled + 1, len(self.starts))
+
+    def start_tick(self):
+        """Starts timing the simulation phases of a tick, which is not a frame of its own"""
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """
+        Records the time since the last mark (or the start of the frame) against a phase
+        Keyword Arguments:
+            phase -- the phase that has just finished, one of PHASES
+        """
+        now = time.perf_counter()
+        self.phases[phase].add(now - self.last)
+        self.last = now
+
+    def end_frame(self):
+        """Finishes timing a frame"""
+        self.frames.add(time.perf_counter() - self.frame_start)
+
+    def fps(self):
+        """Returns the number of frames started per second, over the recent frames"""
+        if self.filled < 2:
+            return 0.0
+        newest = self.starts[self.position - 1]
+        oldest = self.starts[self.position] if self.filled == len(self.starts) else self.starts[0]
+        return (self.filled - 1) / (newest - oldest) if newest > oldest else 0.0
+
+    def slowest_phase(self):
+        """Returns the phase with the longest mean over the recent frames"""
+        return max(PHASES, key=lambda phase: self.phases[phase].recent_mean())
+
+    def summary(self):
+        """Returns the recent figures as one line of text, for the HUD"""
+        slowest = self.slowest_phase()
+        return "{:.1f} fps  frame p50 {:.2f}ms p99 {:.2f}ms  slowest: {} {:.2f}ms".format(
+            self.fps(), self.frames.percentile(0.5) * 1000, self.frames.percentile(0.99) * 1000,
+            slowest, self.phases[slowest].recent_mean() * 1000)
+
+    def dump(self, path):
+        """
+        Saves the whole session's timings as JSON
+        Keyword Arguments:
+            path -- the file to save to
+        """
+        import json
+        data = {"bucket_bounds_ms": [bound * 1000 for bound in BUCKET_BOUNDS],
+                "frame": self.frames.report(),
+                "phases": {phase: self.phases[phase].report() for phase in PHASES}}
+        with open(path, "w") as file:
+            json.dump(data, file, indent=4)
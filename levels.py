@@ -1,21 +1,77 @@
 """
 Creates all the level instances to be used in the main program
+
+The chunks and levels are defined in LEVEL_DATA_PATH. The first time the file
+is loaded (or after it changes) it is compiled into a binary cache, which
+later launches map into memory instead of parsing the JSON. Levels and chunks
+are only built from the cache when they are played.
 """
 
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from sineplane_constants import *
 
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# The cache is the header, then the signal columns (tick, x, y, width, height),
+# then each chunk's length, where each chunk's signals start, where each level's chunks start, the
+# chunks used by each level, whether each level is blind, where each title starts and finally the titles.
+# The start tables have one extra entry for the end of the last one, so nothing
+# has to be added up when the cache is opened, and the header has the length of
+# every table so a cache that was cut short can be told apart from a good one.
+# Arrays are in native byte order, the cache is only meant for this machine.
+# The cache is for the level data with the crc32 in the header. Like a .pyc, if
+# the data file's size and modification time still match the header, it is
+# not read or hashed at all.
+CACHE_MAGIC = b"SSLV"
+CACHE_VERSION = 5
+CACHE_HEADER = struct.Struct("<4sHIqI7I") # magic, version, data size, data mtime, data crc32, easy, medium, hard, levels, level chunks, signals, title bytes
+
+
 class LevelChunk:
-    """250 ticks long (10 seconds), holds all obstacle creation code"""
-    def __init__(self):
-        self.tick_signals = {}
+    """
+    A block of ticks (CHUNK_TICKS, 10 seconds, unless it says otherwise) and
+    the obstacles created during it, in parallel arrays sorted by tick
+    """
+    def __init__(self, length=CHUNK_TICKS):
+        self.length = length
+        
+        self.ticks = array("i")
+        self.xs = array("i")
+        self.ys = array("i")
+        self.widths = array("i")
+        self.heights = array("i")
+        
+    def add_signal(self, tick, x_pos, y_pos, width, height):
+        """
+        Creates an obstacle on a tick, after any others already created on that tick
+        Keyword Arguments:
+            tick -- the tick of the chunk to create the obstacle on, 1 to length - 1
+            x_pos, y_pos, width, height -- the position and size of the obstacle
+        """
+        if not 0 < tick < self.length:
+            raise ValueError("tick {} is not inside a chunk of {} ticks".format(tick, self.length))
+        index = bisect_right(self.ticks, tick)
+        for column, value in zip((self.ticks, self.xs, self.ys, self.widths, self.heights), (tick, x_pos, y_pos, width, height)):
+            column.insert(index, value)
         
         
 class Level:
     """A collection of chunks that make up a level in the game"""
-    def __init__(self, chunks, title):
+    def __init__(self, chunks, title, blind=False):
         self.chunks = chunks
 
         self.title = title
+        # The sin wave is not drawn in blind levels
+        self.blind = blind
         
         self.index = -1
         
@@ -35,571 +91,323 @@ class Level:
         return self.chunks[self.index]
     
         
-def create_chunks():
-    """Creates all the level chunks"""
-    easy_chunks = []
-    medium_chunks = []
-    hard_chunks = []
-    
-    # Create chunks
-    # Of the form: temp_chunk.tick_signals[tick] = (x_pos, y_pos, width, height)
-    
-    # Note that a chunk which will create no obstacles for 250 ticks (10 seconds)
-    #  can simply be created by chunk = LevelChunk().
-    
-    # Predictable
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 300, 50, 300)
-    easy_chunks.append(temp_chunk)
-    
-    # Unpredictable
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,   0, 50, 400)
-    easy_chunks.append(temp_chunk)    
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH,   0, 50, 400)    
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 200, 50, 400)
-    easy_chunks.append(temp_chunk)     
-    
-    # Short and tall
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH,   0, 50, 200)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH,   0, 50, 200)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 400, 50, 200)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH, 400, 50, 200)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 200, 50, 400)
-    easy_chunks.append(temp_chunk)       
 
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH,   0, 50, 100)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH,   0, 50, 400)    
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 500, 50, 100)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 400, 50, 200)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH,   0, 50, 200)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH,   0, 50, 200)
-    easy_chunks.append(temp_chunk) 
-    
-    # And off the wall
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 200, 50, 200)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 250, 50, 100)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 200, 50, 200)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 150, 50, 300)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH, 250, 50, 100)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 250, 50, 100)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 250, 50, 100)
-    easy_chunks.append(temp_chunk)
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 250, 50, 100)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 200, 50, 200)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 200, 50, 200)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 250, 50, 200)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 100, 50, 250)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 300, 50, 150)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 100, 50, 200)
-    easy_chunks.append(temp_chunk)    
-    
-    # Fat and thin
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 250,200, 100)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 250,200, 100)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 100,200, 100)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 400,200, 100)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 100,200, 100)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 400,200, 100)
-    easy_chunks.append(temp_chunk)    
+def compile_levels(data, size, mtime, crc):
+    """
+    Compiles the level data into the bytes of a level cache
+    Keyword Arguments:
+        data -- the parsed level data file
+        size, mtime, crc -- the size, modification time (ns) and crc32 of the level data file
+    """
+    columns = [array("i") for i in range(5)]
+    chunk_lengths = array("I")
+    chunk_starts = array("I", [0])
+    chunk_numbers = {}
+    for difficulty in DIFFICULTIES:
+        for index, chunk in enumerate(data["chunks"][difficulty]):
+            chunk_numbers[difficulty, index] = len(chunk_lengths)
+            length = chunk.get("length", CHUNK_TICKS)
+            if length < 1:
+                raise ValueError("{} chunk {} is {} ticks long, it has to be at least 1".format(difficulty, index, length))
+            chunk_lengths.append(length)
+            # Stable, so obstacles on the same tick are created in the order they are listed
+            for signal in sorted(chunk["signals"], key=lambda signal: signal[0]):
+                if not 0 < signal[0] < length:
+                    raise ValueError("{} chunk {} creates an obstacle on tick {}, outside its {} ticks".format(
+                        difficulty, index, signal[0], length))
+                for column, value in zip(columns, signal):
+                    column.append(value)
+            chunk_starts.append(len(columns[0]))
+    
+    level_starts = array("I", [0])
+    level_chunks = array("I")
+    blind = array("B")
+    title_starts = array("I", [0])
+    titles = bytearray()
+    for level in data["levels"]:
+        level_chunks.extend(chunk_numbers[difficulty, index] for difficulty, index in level["chunks"])
+        level_starts.append(len(level_chunks))
+        blind.append(bool(level.get("blind", False)))
+        titles += level["title"].encode("utf-8")
+        title_starts.append(len(titles))
+        
+    counts = [len(data["chunks"][difficulty]) for difficulty in DIFFICULTIES]
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, size, mtime, crc, *counts,
+                               len(data["levels"]), len(level_chunks), len(columns[0]), len(titles))
+    return b"".join([header] + [column.tobytes() for column in columns] +
+                    [chunk_lengths.tobytes(), chunk_starts.tobytes(), level_starts.tobytes(), level_chunks.tobytes(), blind.tobytes(), title_starts.tobytes(), titles])
 
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 200, 100, 10)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 250, 100, 10)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 300, 100, 10)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 350, 100, 10)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 400, 100, 10)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 450, 100, 10)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 200, 100, 10)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH, 450, 100, 10)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 500, 100, 10)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 150, 100, 10)
-    easy_chunks.append(temp_chunk)    
-    
-    # Heartbeat
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[61]  = (WINDOW_WIDTH, 280, 30, 320)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH, 280, 30, 320)
-    easy_chunks.append(temp_chunk)    
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 280, 30, 320)
-    temp_chunk.tick_signals[61]  = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 280, 30, 320)
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 280, 30, 320)
-    temp_chunk.tick_signals[211] = (WINDOW_WIDTH,   0, 30, 320)
-    easy_chunks.append(temp_chunk)  
-    
-    #Combo
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 280, 30, 320)
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH,   0, 50, 200)
-    easy_chunks.append(temp_chunk)    
 
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 200, 100, 10)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 500, 100, 10)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 300, 100,100)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 400, 100, 10)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 300, 50, 300)
-    easy_chunks.append(temp_chunk) 
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 300, 50, 300)    
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH, 280, 30, 320)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,   0, 30, 320)
-    temp_chunk.tick_signals[211] = (WINDOW_WIDTH, 280, 30, 320)
-    easy_chunks.append(temp_chunk)     
-    
-    # The aim of the game
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 300, 50, 300)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 300, 50, 300)
-    easy_chunks.append(temp_chunk)    
-    
-    # Faster
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[16]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[46]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[61]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[91]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[106] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[121] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[136] = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[166] = (WINDOW_WIDTH, 200, 50, 400)  
-    temp_chunk.tick_signals[181] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[196] = (WINDOW_WIDTH, 200, 50, 400)    
-    temp_chunk.tick_signals[211] = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 200, 50, 400)
-    medium_chunks.append(temp_chunk) 
-    
-    # Morse Code
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 290, 200, 30)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[46]  = (WINDOW_WIDTH, 290, 200, 30)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[91]  = (WINDOW_WIDTH, 290, 200, 30)
-    temp_chunk.tick_signals[121] = (WINDOW_WIDTH, 290, 200, 30)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[166] = (WINDOW_WIDTH, 290, 200, 30)  
-    temp_chunk.tick_signals[196] = (WINDOW_WIDTH, 290, 200, 30)   
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 290, 200, 30) 
-    medium_chunks.append(temp_chunk)  
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[5 + 1]   = (WINDOW_WIDTH, 290, 200, 30) 
-    temp_chunk.tick_signals[5 + 31]  = (WINDOW_WIDTH, 290, 200, 30) 
-    temp_chunk.tick_signals[5 + 61]  = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 76]  = (WINDOW_WIDTH, 290, 200, 30) 
-    temp_chunk.tick_signals[5 + 106] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 121] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 136] = (WINDOW_WIDTH, 290, 200, 30)
-    temp_chunk.tick_signals[5 + 166] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 181] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 196] = (WINDOW_WIDTH, 290, 80, 30)    
-    temp_chunk.tick_signals[5 + 211] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 226] = (WINDOW_WIDTH, 290, 80, 30)
-    temp_chunk.tick_signals[5 + 241] = (WINDOW_WIDTH, 290, 80, 30)    
-    medium_chunks.append(temp_chunk)      
-    
-    # Flappy Bird?
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH + 10,   0, 50, 200)
-    temp_chunk.tick_signals[2]   = (WINDOW_WIDTH,      400, 50, 200)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH + 10,   0, 50, 100)
-    temp_chunk.tick_signals[52]  = (WINDOW_WIDTH,      300, 50, 300)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH + 10,   0, 50, 300)
-    temp_chunk.tick_signals[102] = (WINDOW_WIDTH,      500, 50, 100)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH + 10,   0, 50, 200)
-    temp_chunk.tick_signals[152] = (WINDOW_WIDTH,      400, 50, 200)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH + 10,   0, 50, 300)
-    temp_chunk.tick_signals[202] = (WINDOW_WIDTH,      500, 50, 100)
-    medium_chunks.append(temp_chunk) 
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH + 10,   0, 50,  50)
-    temp_chunk.tick_signals[2]   = (WINDOW_WIDTH,      250, 50, 350)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH + 10,   0, 50, 200)
-    temp_chunk.tick_signals[52]  = (WINDOW_WIDTH,      400, 50, 200)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH + 10,   0, 50, 350)
-    temp_chunk.tick_signals[102] = (WINDOW_WIDTH,      550, 50,  50)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH + 10,   0, 50, 200)
-    temp_chunk.tick_signals[152] = (WINDOW_WIDTH,      400, 50, 200)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH + 10,   0, 50, 200)
-    temp_chunk.tick_signals[202] = (WINDOW_WIDTH,      400, 50, 200)
-    medium_chunks.append(temp_chunk)   
-    
-    # Choices
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH + 20,   0, 50,  50)
-    temp_chunk.tick_signals[2]   = (WINDOW_WIDTH + 10, 150, 50, 100)
-    temp_chunk.tick_signals[3]   = (WINDOW_WIDTH,      420, 50, 180)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH + 20,   0, 50,  50)
-    temp_chunk.tick_signals[52]  = (WINDOW_WIDTH + 10, 100, 50, 200)
-    temp_chunk.tick_signals[53]  = (WINDOW_WIDTH,      480, 50, 120)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH + 20,   0, 50, 200)
-    temp_chunk.tick_signals[102] = (WINDOW_WIDTH + 10, 380, 50,  50)
-    temp_chunk.tick_signals[103] = (WINDOW_WIDTH,      500, 50, 100)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH + 20,   0, 50, 100)
-    temp_chunk.tick_signals[177] = (WINDOW_WIDTH + 10, 280, 50, 200)
-    temp_chunk.tick_signals[178] = (WINDOW_WIDTH,      580, 50,  20)
-    medium_chunks.append(temp_chunk)  
-    
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH + 30,   0, 50,  30)
-    temp_chunk.tick_signals[2]   = (WINDOW_WIDTH + 20, 100, 50, 100)
-    temp_chunk.tick_signals[3]   = (WINDOW_WIDTH + 10, 250, 50, 100)
-    temp_chunk.tick_signals[4]   = (WINDOW_WIDTH,      530, 50,  70)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH + 10,   0, 50, 200)
-    temp_chunk.tick_signals[52]  = (WINDOW_WIDTH,      400, 50, 200)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH + 20,   0, 50, 250)
-    temp_chunk.tick_signals[102] = (WINDOW_WIDTH + 10, 350, 50,  50)
-    temp_chunk.tick_signals[103] = (WINDOW_WIDTH,      570, 50,  30)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH + 20,   0, 50,  50)
-    temp_chunk.tick_signals[152] = (WINDOW_WIDTH + 10, 300, 50,  50)
-    temp_chunk.tick_signals[153] = (WINDOW_WIDTH,      530, 50,  70)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH + 20,   0, 50, 200)
-    temp_chunk.tick_signals[202] = (WINDOW_WIDTH + 10, 400, 50,  50)
-    temp_chunk.tick_signals[203] = (WINDOW_WIDTH,      500, 50, 100)
-    medium_chunks.append(temp_chunk)   
+def cache_size(header):
+    """
+    Returns how many bytes long a level cache with a header should be
+    Keyword Arguments:
+        header -- the header fields of the level cache
+    """
+    magic, version, size, mtime, crc, *counts, level_count, level_chunk_count, signal_count, title_size = header
+    chunk_count = sum(counts)
+    # The signal columns, then the chunk, level, blind and title tables
+    return (CACHE_HEADER.size + 5 * signal_count * 4 + (2 * chunk_count + 1) * 4 +
+            (2 * (level_count + 1) + level_chunk_count) * 4 + level_count + title_size)
 
-    # Split down the middle
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[26] = (WINDOW_WIDTH, 270, 1700, 60) 
-    medium_chunks.append(temp_chunk)   
+
+def read_cache_header(cache):
+    """
+    Returns the header fields of a level cache, or None if it is not a level
+    cache this version can read or it is not as long as its header says
+    Keyword Arguments:
+        cache -- the bytes of the level cache
+    """
+    if len(cache) < CACHE_HEADER.size:
+        return None
+    header = CACHE_HEADER.unpack_from(cache)
+    if header[0] != CACHE_MAGIC or header[1] != CACHE_VERSION:
+        return None
+    if len(cache) != cache_size(header):
+        return None
+    return header
+
+
+class LevelRegistry:
+    """
+    The levels in a level cache. Acts like a list of levels, but each level
+    (and its chunks) is only built the first time it is asked for, and only the
+    last few used are kept.
+    """
+    def __init__(self, cache, level_cache_size=LEVEL_CACHE_SIZE, chunk_cache_size=CHUNK_CACHE_SIZE):
+        """
+        Keyword Arguments:
+            cache -- the level cache, as bytes or a memory map
+            level_cache_size -- how many built levels to keep
+            chunk_cache_size -- how many built chunks to keep
+        """
+        magic, version, size, mtime, crc, *counts, level_count, level_chunk_count, signal_count, title_size = CACHE_HEADER.unpack_from(cache)
+        self.level_count = level_count
+        self.chunk_count = sum(counts)
+        # Identifies the level data the levels were built from
+        self.crc = crc
+        
+        # Where each difficulty's chunks start in the chunk tables
+        self.pools = {}
+        first = 0
+        for difficulty, count in zip(DIFFICULTIES, counts):
+            self.pools[difficulty] = ChunkPool(self, first, count)
+            first += count
+        
+        # Views straight into the cache, nothing is copied until it is used
+        self.cache = memoryview(cache)
+        self.offset = CACHE_HEADER.size
+        self.columns = tuple(self.table("i", signal_count) for i in range(5))
+        self.chunk_lengths = self.table("I", self.chunk_count)
+        self.chunk_starts = self.table("I", self.chunk_count + 1)
+        self.level_starts = self.table("I", level_count + 1)
+        self.level_chunks = self.table("I", level_chunk_count)
+        self.blind = self.table("B", level_count)
+        self.title_starts = self.table("I", level_count + 1)
+        self.titles = self.table("B", title_size)
+        
+        self.levels = OrderedDict()
+        self.level_cache_size = level_cache_size
+        self.chunks = OrderedDict()
+        self.chunk_cache_size = chunk_cache_size
+        self.lock = threading.Lock()
+        
+        # Started the first time a level is prefetched
+        self.prefetcher = None
+        
+    def table(self, typecode, length):
+        """
+        Returns a view of the next table in the cache
+        Keyword Arguments:
+            typecode -- the array typecode of the table's items
+            length -- the number of items in the table
+        """
+        size = length * struct.calcsize(typecode)
+        view = self.cache[self.offset:self.offset + size].cast(typecode)
+        self.offset += size
+        return view
+        
+    def __len__(self):
+        return self.level_count
     
-    # Asteroids
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,  50, 25, 25)
-    temp_chunk.tick_signals[6]   = (WINDOW_WIDTH, 450, 25, 25)
-    temp_chunk.tick_signals[16]  = (WINDOW_WIDTH, 125, 25, 25)
-    temp_chunk.tick_signals[21]  = (WINDOW_WIDTH,  40, 25, 25)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 300, 25, 25)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH, 200, 25, 25)
-    temp_chunk.tick_signals[36]  = (WINDOW_WIDTH, 410, 25, 25)
-    temp_chunk.tick_signals[41]  = (WINDOW_WIDTH, 500, 25, 25)
-    temp_chunk.tick_signals[46]  = (WINDOW_WIDTH, 190, 25, 25)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 280, 25, 25)
-    temp_chunk.tick_signals[56]  = (WINDOW_WIDTH, 100, 25, 25)
-    temp_chunk.tick_signals[61]  = (WINDOW_WIDTH, 550, 25, 25)
-    temp_chunk.tick_signals[66]  = (WINDOW_WIDTH, 150, 25, 25)
-    temp_chunk.tick_signals[71]  = (WINDOW_WIDTH, 180, 25, 25)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 420, 25, 25)
-    temp_chunk.tick_signals[81]  = (WINDOW_WIDTH, 360, 25, 25)
-    temp_chunk.tick_signals[86]  = (WINDOW_WIDTH, 170, 25, 25)
-    temp_chunk.tick_signals[91]  = (WINDOW_WIDTH, 530, 25, 25)
-    temp_chunk.tick_signals[96]  = (WINDOW_WIDTH, 220, 25, 25) 
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH,  10, 25, 25)
-    temp_chunk.tick_signals[106] = (WINDOW_WIDTH, 210, 25, 25)
-    temp_chunk.tick_signals[116] = (WINDOW_WIDTH, 380, 25, 25)
-    temp_chunk.tick_signals[121] = (WINDOW_WIDTH, 440, 25, 25)
-    temp_chunk.tick_signals[126] = (WINDOW_WIDTH, 130, 25, 25)
-    temp_chunk.tick_signals[131] = (WINDOW_WIDTH, 470, 25, 25)
-    temp_chunk.tick_signals[136] = (WINDOW_WIDTH, 390, 25, 25)
-    temp_chunk.tick_signals[141] = (WINDOW_WIDTH, 500, 25, 25)
-    temp_chunk.tick_signals[146] = (WINDOW_WIDTH,  20, 25, 25)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 295, 25, 25)
-    temp_chunk.tick_signals[156] = (WINDOW_WIDTH, 150, 25, 25)
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH, 450, 25, 25)
-    temp_chunk.tick_signals[166] = (WINDOW_WIDTH, 390, 25, 25)
-    temp_chunk.tick_signals[171] = (WINDOW_WIDTH, 540, 25, 25)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH, 140, 25, 25)
-    temp_chunk.tick_signals[181] = (WINDOW_WIDTH, 300, 25, 25)
-    temp_chunk.tick_signals[186] = (WINDOW_WIDTH, 320, 25, 25)
-    temp_chunk.tick_signals[191] = (WINDOW_WIDTH, 180, 25, 25)
-    temp_chunk.tick_signals[196] = (WINDOW_WIDTH, 430, 25, 25) 
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,  10, 25, 25)
-    temp_chunk.tick_signals[206] = (WINDOW_WIDTH, 130, 25, 25)
-    temp_chunk.tick_signals[216] = (WINDOW_WIDTH, 400, 25, 25)
-    temp_chunk.tick_signals[221] = (WINDOW_WIDTH, 320, 25, 25)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 550, 25, 25)
-    temp_chunk.tick_signals[231] = (WINDOW_WIDTH, 180, 25, 25)
-    temp_chunk.tick_signals[236] = (WINDOW_WIDTH, 420, 25, 25)
-    temp_chunk.tick_signals[241] = (WINDOW_WIDTH, 500, 25, 25)
-    temp_chunk.tick_signals[246] = (WINDOW_WIDTH,  50, 25, 25)    
-    medium_chunks.append(temp_chunk)   
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.level_count
+        if not 0 <= index < self.level_count:
+            raise IndexError("level index out of range")
+        return self.cached(self.levels, self.level_cache_size, index, self.build_level)
     
-    # Good Aim
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH,      270, 1000,  60)
-    temp_chunk.tick_signals[141] = (WINDOW_WIDTH + 10,   0,   50, 250)
-    temp_chunk.tick_signals[142] = (WINDOW_WIDTH,      350,   50, 250)
-    temp_chunk.tick_signals[163] = (WINDOW_WIDTH,      270,  780,  60)    
-    temp_chunk.tick_signals[246] = (WINDOW_WIDTH + 10,   0,   50, 255)
-    temp_chunk.tick_signals[247] = (WINDOW_WIDTH,      345,   50, 255)
-    medium_chunks.append(temp_chunk)     
+    def title(self, index):
+        """
+        Returns the title of a level without building it
+        Keyword Arguments:
+            index -- the index of the level
+        """
+        return str(self.titles[self.title_starts[index]:self.title_starts[index + 1]], "utf-8")
     
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[8]   = (WINDOW_WIDTH,      270, 1930,  60)   
-    temp_chunk.tick_signals[211] = (WINDOW_WIDTH + 10,   0,   50, 270)
-    temp_chunk.tick_signals[212] = (WINDOW_WIDTH,      330,   50, 270)
-    medium_chunks.append(temp_chunk)     
+    def chunk(self, number):
+        """
+        Returns a chunk, building it if it is not cached
+        Keyword Arguments:
+            number -- the chunk's position in the cache (easy, then medium, then hard)
+        """
+        return self.cached(self.chunks, self.chunk_cache_size, number, self.build_chunk)
     
-    # Fasterer!
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[11]  = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[21]  = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[41]  = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[61]  = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[71]  = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[81]  = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[91]  = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[101] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[111] = (WINDOW_WIDTH, 200, 30, 400)  
-    temp_chunk.tick_signals[121] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[131] = (WINDOW_WIDTH, 200, 30, 400)    
-    temp_chunk.tick_signals[141] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[171] = (WINDOW_WIDTH, 200, 30, 400)   
-    temp_chunk.tick_signals[181] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[191] = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[211] = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[221] = (WINDOW_WIDTH,   0, 30, 400)
-    temp_chunk.tick_signals[231] = (WINDOW_WIDTH, 200, 30, 400)
-    temp_chunk.tick_signals[241] = (WINDOW_WIDTH,   0, 30, 400)
-    hard_chunks.append(temp_chunk)
+    def cached(self, built, cache_size, key, build):
+        """
+        Returns an item from one of the caches of built items, building it and
+        dropping the least recently used item if it is not there
+        Keyword Arguments:
+            built -- the OrderedDict of built items
+            cache_size -- the most items to keep
+            key -- the item's key
+            build -- the function to build the item from its key
+        """
+        with self.lock:
+            item = built.get(key)
+            if item is not None:
+                built.move_to_end(key)
+                return item
+        
+        # Built outside the lock, so the game does not wait on a prefetch of a
+        # different level. If two threads build the same item the first one wins.
+        item = build(key)
+        with self.lock:
+            item = built.setdefault(key, item)
+            built.move_to_end(key)
+            while len(built) > cache_size:
+                built.popitem(last=False)
+        return item
+    
+    def build_chunk(self, number):
+        """
+        Builds a chunk from the cache
+        Keyword Arguments:
+            number -- the chunk's position in the cache
+        """
+        start = self.chunk_starts[number]
+        end = self.chunk_starts[number + 1]
+        ticks, xs, ys, widths, heights = (column[start:end] for column in self.columns)
+        chunk = LevelChunk(self.chunk_lengths[number])
+        chunk.ticks = array("i", ticks)
+        chunk.xs = array("i", [x + WINDOW_WIDTH for x in xs])
+        chunk.ys = array("i", ys)
+        chunk.widths = array("i", widths)
+        chunk.heights = array("i", heights)
+        return chunk
+    
+    def build_level(self, index):
+        """
+        Builds a level and its chunks from the cache
+        Keyword Arguments:
+            index -- the index of the level
+        """
+        numbers = self.level_chunks[self.level_starts[index]:self.level_starts[index + 1]]
+        return Level([self.chunk(number) for number in numbers], self.title(index), bool(self.blind[index]))
     
-    # Outta Nowhere
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0,   10,  10)
-    temp_chunk.tick_signals[66]  = (WINDOW_WIDTH - 650,   0, 50, 400)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH,  590,  10,  10)
-    temp_chunk.tick_signals[96]  = (WINDOW_WIDTH - 650, 200, 50, 400)  
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,  590,  10,  10)
-    temp_chunk.tick_signals[116] = (WINDOW_WIDTH - 650, 200, 50, 400)     
-    temp_chunk.tick_signals[71]  = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[136] = (WINDOW_WIDTH - 650,   0, 50, 400) 
-    temp_chunk.tick_signals[121] = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[186] = (WINDOW_WIDTH - 650,   0, 50, 400)   
-    temp_chunk.tick_signals[141] = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[206] = (WINDOW_WIDTH - 650,   0, 50, 400) 
-    temp_chunk.tick_signals[161] = (WINDOW_WIDTH,  590,  10,  10)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH - 650, 200, 50, 400)
-    temp_chunk.tick_signals[191] = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[241] = (WINDOW_WIDTH,    0,  10,  10)
-    hard_chunks.append(temp_chunk)
+    def prefetch(self, index):
+        """
+        Builds a level in the background, so it is ready by the time it is played.
+        Does nothing if there is no such level.
+        Keyword Arguments:
+            index -- the index of the level
+        """
+        if not 0 <= index < self.level_count:
+            return None
+        return self.background().submit(self.__getitem__, index)
     
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[6]   = (WINDOW_WIDTH - 650,   0,  50,  400)
-    temp_chunk.tick_signals[56]  = (WINDOW_WIDTH - 650,   0,  50,  400)
+    def background(self):
+        """
+        Returns the executor levels are prefetched on, a single thread so work
+        submitted to it is run in order
+        """
+        if self.prefetcher is None:
+            self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        return self.prefetcher
     
-    temp_chunk.tick_signals[11]  = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH - 650,   0,  50,  400)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[96]  = (WINDOW_WIDTH - 650,   0,  50,  400)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[116] = (WINDOW_WIDTH - 650,   0,  50,  400)    
-    temp_chunk.tick_signals[86]  = (WINDOW_WIDTH,  590,  10,  10)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH - 650, 200,  50,  400)
-    temp_chunk.tick_signals[106] = (WINDOW_WIDTH,  590,  10,  10)
-    temp_chunk.tick_signals[171] = (WINDOW_WIDTH - 650, 200,  50,  400)  
-    temp_chunk.tick_signals[156] = (WINDOW_WIDTH,    0,  10,  10)
-    temp_chunk.tick_signals[221] = (WINDOW_WIDTH - 650,   0,  50,  400)    
-    hard_chunks.append(temp_chunk)    
     
-    # Tetris
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH, 200, 30, 120)
-    temp_chunk.tick_signals[16]  = (WINDOW_WIDTH, 400, 60,  30)
-    temp_chunk.tick_signals[19]  = (WINDOW_WIDTH, 430, 60,  30)
-    temp_chunk.tick_signals[31]  = (WINDOW_WIDTH, 180, 30,  90)
-    temp_chunk.tick_signals[34]  = (WINDOW_WIDTH, 210, 30,  30)
-    temp_chunk.tick_signals[46]  = (WINDOW_WIDTH, 100,120,  30)
-    temp_chunk.tick_signals[61]  = (WINDOW_WIDTH, 500, 30,  60)
-    temp_chunk.tick_signals[64]  = (WINDOW_WIDTH, 530, 30,  60)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 300, 60,  30)
-    temp_chunk.tick_signals[79]  = (WINDOW_WIDTH, 270, 60,  30)
-    temp_chunk.tick_signals[91]  = (WINDOW_WIDTH, 480, 90,  30)
-    temp_chunk.tick_signals[94]  = (WINDOW_WIDTH, 510, 30,  30)
-    temp_chunk.tick_signals[106] = (WINDOW_WIDTH,  50, 60,  30)
-    temp_chunk.tick_signals[109] = (WINDOW_WIDTH,  80, 60,  30)
-    temp_chunk.tick_signals[121] = (WINDOW_WIDTH, 300, 30, 120)
-    temp_chunk.tick_signals[136] = (WINDOW_WIDTH, 500,120,  30)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 160, 30,  60)
-    temp_chunk.tick_signals[154] = (WINDOW_WIDTH, 190, 30,  60)
-    temp_chunk.tick_signals[166] = (WINDOW_WIDTH, 200, 30,  30) 
-    temp_chunk.tick_signals[169] = (WINDOW_WIDTH, 170, 30,  90)
-    temp_chunk.tick_signals[181] = (WINDOW_WIDTH, 300, 30, 120)
-    temp_chunk.tick_signals[196] = (WINDOW_WIDTH, 500, 60,  30)
-    temp_chunk.tick_signals[199] = (WINDOW_WIDTH, 470, 60,  30) 
-    temp_chunk.tick_signals[211] = (WINDOW_WIDTH, 300, 60,  30)
-    temp_chunk.tick_signals[214] = (WINDOW_WIDTH, 270, 60,  30)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH,  80, 90,  30)
-    temp_chunk.tick_signals[229] = (WINDOW_WIDTH, 110, 30,  30)
-    temp_chunk.tick_signals[241] = (WINDOW_WIDTH, 500, 60,  30)
-    temp_chunk.tick_signals[244] = (WINDOW_WIDTH, 530, 60,  30)
-    hard_chunks.append(temp_chunk)     
+class ChunkPool:
+    """The chunks of one difficulty, acting like a list of chunks"""
+    def __init__(self, registry, first, count):
+        self.registry = registry
+        self.first = first
+        self.count = count
+        
+    def __len__(self):
+        return self.count
     
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[5 + 1]   = (WINDOW_WIDTH, 100, 30, 120)
-    temp_chunk.tick_signals[5 + 16]  = (WINDOW_WIDTH, 200, 60,  30)
-    temp_chunk.tick_signals[5 + 19]  = (WINDOW_WIDTH, 230, 60,  30)
-    temp_chunk.tick_signals[5 + 31]  = (WINDOW_WIDTH, 400, 30,  90)
-    temp_chunk.tick_signals[5 + 34]  = (WINDOW_WIDTH, 430, 30,  30)
-    temp_chunk.tick_signals[5 + 46]  = (WINDOW_WIDTH, 380,120,  30)
-    temp_chunk.tick_signals[5 + 61]  = (WINDOW_WIDTH,  50, 30,  60)
-    temp_chunk.tick_signals[5 + 64]  = (WINDOW_WIDTH,  80, 30,  60)
-    temp_chunk.tick_signals[5 + 76]  = (WINDOW_WIDTH, 300, 60,  30)
-    temp_chunk.tick_signals[5 + 79]  = (WINDOW_WIDTH, 270, 60,  30)
-    temp_chunk.tick_signals[5 + 91]  = (WINDOW_WIDTH, 480, 90,  30)
-    temp_chunk.tick_signals[5 + 94]  = (WINDOW_WIDTH, 510, 30,  30)
-    temp_chunk.tick_signals[5 + 106] = (WINDOW_WIDTH, 250, 60,  30)
-    temp_chunk.tick_signals[5 + 109] = (WINDOW_WIDTH, 280, 60,  30)
-    temp_chunk.tick_signals[5 + 121] = (WINDOW_WIDTH,  80, 30, 120)
-    temp_chunk.tick_signals[5 + 136] = (WINDOW_WIDTH, 450,120,  30)
-    temp_chunk.tick_signals[5 + 151] = (WINDOW_WIDTH, 260, 30,  60)
-    temp_chunk.tick_signals[5 + 154] = (WINDOW_WIDTH, 290, 30,  60)
-    temp_chunk.tick_signals[5 + 166] = (WINDOW_WIDTH, 400, 30,  30) 
-    temp_chunk.tick_signals[5 + 169] = (WINDOW_WIDTH, 370, 30,  90)
-    temp_chunk.tick_signals[5 + 181] = (WINDOW_WIDTH,  40, 30, 120)
-    temp_chunk.tick_signals[5 + 196] = (WINDOW_WIDTH, 450, 60,  30)
-    temp_chunk.tick_signals[5 + 199] = (WINDOW_WIDTH, 420, 60,  30) 
-    temp_chunk.tick_signals[5 + 211] = (WINDOW_WIDTH, 300, 60,  30)
-    temp_chunk.tick_signals[5 + 214] = (WINDOW_WIDTH, 270, 60,  30)
-    temp_chunk.tick_signals[5 + 226] = (WINDOW_WIDTH, 100, 90,  30)
-    temp_chunk.tick_signals[5 + 229] = (WINDOW_WIDTH, 130, 30,  30)
-    hard_chunks.append(temp_chunk)  
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("chunk index out of range")
+        return self.registry.chunk(self.first + index)
     
-    # The Grand Finale
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[1]   = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[26]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[51]  = (WINDOW_WIDTH,   0, 50, 400)
-    temp_chunk.tick_signals[76]  = (WINDOW_WIDTH, 200, 50, 400)
-    temp_chunk.tick_signals[106] = (WINDOW_WIDTH,  50, 60,  30)
-    temp_chunk.tick_signals[109] = (WINDOW_WIDTH,  80, 60,  30)
-    temp_chunk.tick_signals[136] = (WINDOW_WIDTH, 500,120,  30)
-    temp_chunk.tick_signals[151] = (WINDOW_WIDTH, 160, 30,  60)
-    temp_chunk.tick_signals[154] = (WINDOW_WIDTH, 190, 30,  60)
-    temp_chunk.tick_signals[166] = (WINDOW_WIDTH, 200, 30,  30) 
-    temp_chunk.tick_signals[169] = (WINDOW_WIDTH, 170, 30,  90)
-    temp_chunk.tick_signals[181] = (WINDOW_WIDTH, 300, 30, 120)
-    temp_chunk.tick_signals[196] = (WINDOW_WIDTH, 500, 60,  30)
-    temp_chunk.tick_signals[199] = (WINDOW_WIDTH, 470, 60,  30) 
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,  10, 25, 25)
-    temp_chunk.tick_signals[216] = (WINDOW_WIDTH, 400, 25, 25)
-    temp_chunk.tick_signals[221] = (WINDOW_WIDTH, 320, 25, 25)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 550, 25, 25)
-    temp_chunk.tick_signals[231] = (WINDOW_WIDTH, 180, 25, 25)
-    temp_chunk.tick_signals[236] = (WINDOW_WIDTH, 420, 25, 25)
-    temp_chunk.tick_signals[241] = (WINDOW_WIDTH, 500, 25, 25)
-    temp_chunk.tick_signals[246] = (WINDOW_WIDTH,  50, 25, 25)   
-    easy_chunks.append(temp_chunk)    
 
-    temp_chunk = LevelChunk()
-    temp_chunk.tick_signals[21]   = (WINDOW_WIDTH,   0,   10,  10)
-    temp_chunk.tick_signals[86]  = (WINDOW_WIDTH - 650,   0, 50, 400) 
-    temp_chunk.tick_signals[71]  = (WINDOW_WIDTH,  590,  10,  10)
-    temp_chunk.tick_signals[136] = (WINDOW_WIDTH - 650, 200, 50, 400)
-    temp_chunk.tick_signals[176] = (WINDOW_WIDTH + 20,   0, 50, 100)
-    temp_chunk.tick_signals[177] = (WINDOW_WIDTH + 10, 280, 50, 200)
-    temp_chunk.tick_signals[178] = (WINDOW_WIDTH,      580, 50,  20)    
-    temp_chunk.tick_signals[201] = (WINDOW_WIDTH,   0, 50, 300)
-    temp_chunk.tick_signals[226] = (WINDOW_WIDTH, 300, 50, 300)
-    easy_chunks.append(temp_chunk) 
-            
-    return easy_chunks, medium_chunks, hard_chunks
+def map_cache(cache_path):
+    """
+    Maps a level cache into memory, returns b"" if it can not be
+    Keyword Arguments:
+        cache_path -- the compiled level cache
+    """
+    try:
+        with open(cache_path, "rb") as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # ValueError if the file is empty
+        return b""
 
 
-def create_levels(easy_chunks, medium_chunks, hard_chunks):
-    """Creates all levels"""
-    levels = []
-    
-    # Easy levels (using the easy chunks)
-    # 1-8
-    levels.append(Level([easy_chunks[14]], "The aim of the game"))
-    levels.append(Level([easy_chunks[0]], "Predictable"))
-    levels.append(Level([easy_chunks[1], easy_chunks[2]], "Unpredictable"))
-    levels.append(Level([easy_chunks[3], easy_chunks[4]], "Short and Tall"))
-    levels.append(Level([easy_chunks[5], easy_chunks[6]], "And off the Wall"))
-    levels.append(Level([easy_chunks[7], easy_chunks[8]], "Fat and Thin"))
-    levels.append(Level([easy_chunks[9], easy_chunks[10]], "Heartbeat"))
-    levels.append(Level([easy_chunks[11], easy_chunks[12], easy_chunks[13]], "Combo")) # TO DO
-    
-    # Medium levels (chunks are out of order, as I wanted to balance the levels
-    # and did not do that exactly in order as for the easy levels).
-    # 9-14
-    levels.append(Level([medium_chunks[0]], "Faster!"))
-    levels.append(Level([medium_chunks[7]], "Split down the middle"))
-    levels.append(Level([medium_chunks[3], medium_chunks[4]], "Flappy Bird?"))
-    levels.append(Level([medium_chunks[5], medium_chunks[6]], "Choices"))
-    levels.append(Level([medium_chunks[1], medium_chunks[2]], "Morse Code"))
-    levels.append(Level([medium_chunks[9], medium_chunks[10]], "Good Aim"))
-    levels.append(Level([medium_chunks[8]], "Asteroids"))
-    
-    # Hard levels
-    # 16-18
-    levels.append(Level([hard_chunks[0]], "Fasterer!"))
-    levels.append(Level([hard_chunks[3], hard_chunks[4]], "Tetris"))
-    
-    # Quite hard, maybe level 18
-    levels.append(Level([hard_chunks[1], hard_chunks[2]], "Outta Nowhere"))
-    
-    # Blind levels
-    # 19-20
-    levels.append(Level([easy_chunks[0]], "Driving Blind"))
-    
-    # And one here (finale)
-    levels.append(Level([easy_chunks[15], easy_chunks[16]], "The Grand Finale"))
+def save_cache(cache_path, cache):
+    """
+    Writes a level cache. It is written to a temporary file that then replaces
+    the old cache, so another process mapping the old cache (or loading at the
+    same time) never sees a half written one.
+    Keyword Arguments:
+        cache_path -- the compiled level cache
+        cache -- the bytes of the level cache
+    """
+    temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(cache)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # Still playable, just compiled again next time
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
 
-    return levels
\ No newline at end of file
+def load_levels(data_path=LEVEL_DATA_PATH, cache_path=LEVEL_CACHE_PATH):
+    """
+    Returns the easy, medium and hard chunk pools and the level registry,
+    using the level cache if it is up to date and rebuilding it if not
+    Keyword Arguments:
+        data_path -- the level data file
+        cache_path -- the compiled level cache
+    """
+    stat = os.stat(data_path)
+    cache = map_cache(cache_path)
+    header = read_cache_header(cache)
+    if header is None or header[2:4] != (stat.st_size, stat.st_mtime_ns):
+        with open(data_path, "rb") as file:
+            data = file.read()
+        crc = zlib.crc32(data)
+        if header is not None and (header[2], header[4]) == (len(data), crc):
+            # Same levels, the file was just touched, so only the header changes
+            stamped = bytearray(cache)
+            CACHE_HEADER.pack_into(stamped, 0, *header[:3], stat.st_mtime_ns, *header[4:])
+        else:
+            # Only needed when the cache is out of date, and slow to import
+            import json
+            stamped = compile_levels(json.loads(data.decode("utf-8")), len(data), stat.st_mtime_ns, crc)
+        
+        if isinstance(cache, mmap.mmap):
+            cache.close()
+        cache = stamped
+        save_cache(cache_path, cache)
+    
+    registry = LevelRegistry(cache)
+    return registry.pools["easy"], registry.pools["medium"], registry.pools["hard"], registry
@@ -0,0 +1,248 @@
+"""
+Generates new chunks from a seed
+
+Run with: python procedural.py [--seed N] [--count N] [--verify N] [--json]
+
+Chunks are made of walls at random spacings. Each wall is either a gate (an
+opening between two obstacles) or a block floating above or below the plane.
+Every chunk is built round a run through it: random inputs are held for a
+few ticks at a time, starting from a fresh game's sin wave, and the plane's
+height is worked out for every tick with a SinWave the way the Simulation
+does it. Each wall is then placed so it leaves clear every height the plane
+is at on the ticks the wall crosses the plane's column. Holding those inputs
+survives the chunk, so every chunk can be survived without searching for a
+way through it.
+
+--verify runs the exact search from verify_levels on the first few chunks
+as well, and reports how many of the starting angles they can be survived from.
+
+The same seed and style always give the same chunks, and the chunks already
+generated for a seed are kept so they are not generated twice.
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from verify_levels import *
+from sinewave import SIN_TABLE, SIN_TABLE_SHIFT, SinWave
+
+# Extra pixels kept clear round the plane's path
+PROCEDURAL_PADDING = 2
+
+# Seeds (with styles) whose chunks are kept
+PROCEDURAL_CACHE_SIZE = 8
+
+# spacing -- (min, max) ticks from one wall to the next, lower is denser
+# gap -- (min, max) height of the opening in a gate, widened if the plane's path needs it
+# width -- (min, max) width of every obstacle
+# block_chance -- how often a wall is a floating block instead of a gate
+# block_height -- (min, max) height of a block
+# length -- ticks in each chunk
+# hold -- (min, max) ticks each input of the run is held for
+# steer_chance -- how often the input held is a key rather than nothing
+# exponents -- (min, max) period exponent the run keeps the sin wave in
+ChunkStyle = namedtuple("ChunkStyle", ["spacing", "gap", "width", "block_chance", "block_height", "length",
+                                       "hold", "steer_chance", "exponents"])
+DEFAULT_STYLE = ChunkStyle(spacing=(20, 40), gap=(140, 240), width=(20, 80),
+                           block_chance=0.3, block_height=(100, 260), length=CHUNK_TICKS,
+                           hold=(1, 20), steer_chance=0.4, exponents=(-8, 8))
+
+
+@lru_cache(maxsize=None)
+def fresh_wave():
+    """Returns the (phase, exponent) of the sin wave on the tick a fresh game's first chunk starts"""
+    sim = Simulation([], [], [], [Level([LevelChunk()], "Generated")])
+    sim.start_level(0)
+    # The last tick of the title already moves the wave on
+    while sim.showing_title:
+        sim.step(False, False)
+    return sim.sin.phase, sim.sin.exponent
+
+
+def sample_run(rng, style, ticks):
+    """
+    Returns the plane's height on every tick of a chunk, for a run of random
+    inputs from a fresh game's sin wave
+    Keyword Arguments:
+        rng -- the random.Random to pick the inputs with
+        style -- the ChunkStyle to generate in
+        ticks -- the number of ticks to run for
+    """
+    wave = SinWave()
+    wave.phase, wave.exponent = fresh_wave()
+    lowest, highest = style.exponents
+    
+    # The plane is moved to the wave before the collision check, then the
+    # input changes the wave, so each tick's phase is the one before it moves on
+    phases = []
+    while len(phases) < ticks:
+        change = rng.choice((LEFT, RIGHT)) if rng.random() < style.steer_chance else NONE
+        held = min(rng.randint(*style.hold), ticks - len(phases))
+        if not lowest <= wave.exponent + change <= highest:
+            change = NONE
+        elif change != NONE:
+            # Only held until the wave reaches the edge of the exponents
+            held = min(held, highest - wave.exponent if change == RIGHT else wave.exponent - lowest)
+        phases.extend(wave.hold(held, change))
+    return [SIN_TABLE[phase >> SIN_TABLE_SHIFT] for phase in phases]
+
+
+def column_ticks(tick, x_pos, width):
+    """
+    Returns the (first, last + 1) tick of a chunk that an obstacle is level with
+    the plane on
+    Keyword Arguments:
+        tick -- the tick the obstacle is created on
+        x_pos, width -- the obstacle's x position when created and its width
+    """
+    # Obstacles move on the tick they are created, before the collision check
+    left = PLANE_STARTING_X - PLANE_WIDTH / 2
+    right = PLANE_STARTING_X + PLANE_WIDTH / 2
+    first = tick + math.floor((x_pos - right) / MOVESPEED)
+    end = tick - 1 + math.ceil((x_pos + width - left) / MOVESPEED)
+    return max(first, tick), end
+
+
+def generate_chunk(rng, style):
+    """
+    Generates a chunk round a random run through it, see the module docstring
+    Keyword Arguments:
+        rng -- the random.Random to generate with
+        style -- the ChunkStyle to generate in
+    """
+    # The run carries on past the end of the chunk until its last wall has passed the plane
+    heights = sample_run(rng, style, column_ticks(style.length, WINDOW_WIDTH, style.width[1])[1] + 1)
+    
+    chunk = LevelChunk(style.length)
+    tick = rng.randint(*style.spacing)
+    while tick < style.length:
+        width = rng.randint(*style.width)
+        # A tick either side as well, so a rounding difference can not matter
+        first, end = column_ticks(tick, WINDOW_WIDTH, width)
+        passing = heights[first - 1:end + 1]
+        # The wall has to be clear of clear_top -> clear_bottom
+        clear_top = math.floor(min(passing) - PLANE_HEIGHT / 2 - PROCEDURAL_PADDING)
+        clear_bottom = math.ceil(max(passing) + PLANE_HEIGHT / 2 + PROCEDURAL_PADDING)
+        
+        placed = False
+        if rng.random() < style.block_chance:
+            height = rng.randint(*style.block_height)
+            sides = []
+            if clear_top >= height:
+                sides.append((0, clear_top - height))
+            if WINDOW_HEIGHT - clear_bottom >= height:
+                sides.append((clear_bottom, WINDOW_HEIGHT - height))
+            if sides:
+                chunk.add_signal(tick, WINDOW_WIDTH, rng.randint(*rng.choice(sides)), width, height)
+                placed = True
+        if not placed:
+            gap = max(rng.randint(*style.gap), clear_bottom - clear_top)
+            top = rng.randint(max(0, clear_bottom - gap), min(clear_top, WINDOW_HEIGHT - gap))
+            if top > 0:
+                chunk.add_signal(tick, WINDOW_WIDTH, 0, width, top)
+            if top + gap < WINDOW_HEIGHT:
+                chunk.add_signal(tick, WINDOW_WIDTH, top + gap, width, WINDOW_HEIGHT - top - gap)
+        tick += rng.randint(*style.spacing)
+    return chunk
+
+
+class ChunkGenerator:
+    """
+    The chunks for one seed and style. Acts like an endless list of chunks,
+    generating more as they are asked for.
+    """
+    def __init__(self, seed, style=DEFAULT_STYLE):
+        self.seed = seed
+        self.style = style
+        self.rng = random.Random(seed)
+
+        self.generated = []
+
+    def __getitem__(self, index):
+        while len(self.generated) <= index:
+            self.generated.append(generate_chunk(self.rng, self.style))
+        return self.generated[index]
+
+    def take(self, count):
+        """
+        Returns the first count chunks
+        Keyword Arguments:
+            count -- the number of chunks
+        """
+        self[count - 1]
+        return self.generated[:count]
+
+
+@lru_cache(maxsize=PROCEDURAL_CACHE_SIZE)
+def chunk_generator(seed, style=DEFAULT_STYLE):
+    """
+    Returns the ChunkGenerator for a seed, keeping the chunks it has already generated
+    Keyword Arguments:
+        seed -- the seed
+        style -- the ChunkStyle to generate in
+    """
+    return ChunkGenerator(seed, style)
+
+
+def chunk_coverage(chunk):
+    """
+    Returns the fraction of starting angles (with a fresh game's sin wave) that
+    the exact search in verify_levels can survive the chunk from
+    Keyword Arguments:
+        chunk -- the LevelChunk to check
+    """
+    levels = [Level([chunk], "Generated")]
+    viable = search(level_timeline(TimelineSimulation([], [], [], levels), 0))
+    
+    sim = Simulation([], [], [], levels)
+    sim.start_level(0)
+    return sum(end - start for start, end in viable[0][sim.sin.exponent]) / TWO_PI
+
+
+def chunk_json(chunk, name):
+    """
+    Returns a chunk as text in the format of the level data file
+    Keyword Arguments:
+        chunk -- the LevelChunk
+        name -- the name to give it
+    """
+    signals = ",\n".join("        [{}, {}, {}, {}, {}]".format(tick, x - WINDOW_WIDTH, y, width, height)
+                         for tick, x, y, width, height in zip(chunk.ticks, chunk.xs, chunk.ys, chunk.widths, chunk.heights))
+    return '{{"name": {}, "length": {}, "signals": [\n{}\n]}}'.format(json.dumps(name), chunk.length, signals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates new chunks from a seed")
+    parser.add_argument("--seed", type=int, default=0, help="seed to generate from (default: %(default)s)")
+    parser.add_argument("--count", type=int, default=1000, help="number of chunks to generate (default: %(default)s)")
+    parser.add_argument("--verify", type=int, default=0, metavar="N", help="check the first N chunks with the exact search")
+    parser.add_argument("--json", action="store_true", help="print the chunks in the level data format")
+    args = parser.parse_args()
+
+    generator = chunk_generator(args.seed)
+    t = time.time()
+    chunks = generator.take(args.count)
+    taken = time.time() - t
+
+    if args.json:
+        print(",\n".join(chunk_json(chunk, "Seed {} #{}".format(args.seed, i)) for i, chunk in enumerate(chunks)))
+        return 0
+
+    print("Generated {} chunks in {:.2f}s ({:.0f} per second)".format(len(chunks), taken, len(chunks) / taken))
+
+    if args.verify:
+        t = time.time()
+        coverages = [chunk_coverage(chunk) for chunk in chunks[:args.verify]]
+        solvable = sum(coverage > 0 for coverage in coverages)
+        print("Exact search: {} of {} solvable, {:.0%} of start angles on average  {:.2f}s".format(
+            solvable, len(coverages), sum(coverages) / len(coverages), time.time() - t))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
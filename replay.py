@@ -0,0 +1,218 @@
+"""
+Records runs as replays, and plays them back
+
+Run with: python replay.py FILE... (plays replays headless and prints how they ended)
+
+A replay holds what is needed to start the run again - the level (or the
+seed of an endless run) and the sin wave it started with - and the keys held
+on every tick, packed 2 bits a tick, so a 10 second chunk takes 63 bytes. The
+Simulation does the same thing every time it is given the same keys, so
+stepping a fresh one with the recorded keys plays the run out exactly.
+
+The crc32 of the level data is kept too, as a replay can only be trusted on
+the levels it was recorded with.
+"""
+
+import argparse
+import os
+import struct
+import time
+
+from simulation import *
+
+REPLAY_MAGIC = b"SSRP"
+REPLAY_VERSION = 2
+REPLAY_HEADER = struct.Struct("<4sHiqIhII") # magic, version, level (-1 for endless), seed, sin phase, sin exponent, level data crc32, ticks
+
+# The 2 bits of each tick, 4 ticks to a byte starting from the low bits
+LEFT_BIT = 1
+RIGHT_BIT = 2
+TICKS_PER_BYTE = 4
+
+# The (left, right) keys of the 4 ticks in each possible byte
+UNPACKED_BYTES = [tuple((bool(byte >> shift & LEFT_BIT), bool(byte >> shift & RIGHT_BIT)) for shift in range(0, 8, 2))
+                  for byte in range(256)]
+
+
+class Replay:
+    """A recorded run: how it started and the keys held on every tick"""
+    def __init__(self, level, seed, phase, exponent, crc):
+        """
+        Keyword Arguments:
+            level -- the index of the level played, -1 for an endless run
+            seed -- the seed of an endless run's chunks
+            phase, exponent -- the sin wave at the start of the run
+            crc -- the crc32 of the level data the run was played on
+        """
+        self.level = level
+        self.seed = seed
+        self.phase = phase
+        self.exponent = exponent
+        self.crc = crc
+
+        self.ticks = 0
+        self.inputs = bytearray()
+
+    @classmethod
+    def start(cls, sim, seed=0):
+        """
+        Returns an empty replay for the run a Simulation has just started
+        Keyword Arguments:
+            sim -- the Simulation, straight after start_level or start_endless
+            seed -- the seed the endless run was started with
+        """
+        level = -1 if sim.run_mode == "Endless" else sim.current_level
+        return cls(level, seed, sim.sin.phase, sim.sin.exponent, sim.levels.crc)
+
+    def record(self, left, right):
+        """
+        Adds the keys held for the next tick
+        Keyword Arguments:
+            left, right -- True if the key is held
+        """
+        shift = self.ticks % TICKS_PER_BYTE * 2
+        if shift == 0:
+            self.inputs.append(0)
+        self.inputs[-1] |= (left * LEFT_BIT | right * RIGHT_BIT) << shift
+        self.ticks += 1
+
+    def __len__(self):
+        return self.ticks
+
+    def __iter__(self):
+        """Yields the (left, right) keys held on each tick"""
+        ticks = self.ticks
+        for byte in self.inputs:
+            if ticks < TICKS_PER_BYTE:
+                yield from UNPACKED_BYTES[byte][:ticks]
+                return
+            yield from UNPACKED_BYTES[byte]
+            ticks -= TICKS_PER_BYTE
+
+    def to_bytes(self):
+        """Returns the replay in its file format"""
+        return REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.level, self.seed, self.phase,
+                                  self.exponent, self.crc, self.ticks) + bytes(self.inputs)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Reads a replay from its file format
+        Keyword Arguments:
+            data -- the bytes of the replay
+        """
+        magic, version, level, seed, phase, exponent, crc, ticks = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("not a replay, or a replay from a different version")
+        replay = cls(level, seed, phase, exponent, crc)
+        replay.ticks = ticks
+        replay.inputs = bytearray(data[REPLAY_HEADER.size:])
+        if len(replay.inputs) != -(-ticks // TICKS_PER_BYTE):
+            raise ValueError("replay is the wrong length for its tick count")
+        return replay
+
+    def save(self, path):
+        """
+        Writes the replay to a file
+        Keyword Arguments:
+            path -- the file to write
+        """
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a replay from a file
+        Keyword Arguments:
+            path -- the file to read
+        """
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+def start_replay(sim, replay):
+    """
+    Starts a Simulation on the run a replay recorded
+    Keyword Arguments:
+        sim -- the Simulation, with the game's chunks and levels
+        replay -- the replay
+    """
+    if replay.crc != sim.levels.crc:
+        raise ValueError("replay was recorded on different level data")
+    if replay.level < 0:
+        sim.start_endless(replay.seed)
+    else:
+        sim.start_level(replay.level)
+    sim.sin.phase = replay.phase
+    sim.sin.exponent = replay.exponent
+
+
+def run_replay(sim, replay):
+    """
+    Plays a replay headless, as fast as possible. Returns the number of ticks run
+    and the events of the last one.
+    Keyword Arguments:
+        sim -- the Simulation, with the game's chunks and levels
+        replay -- the replay
+    """
+    start_replay(sim, replay)
+    ticks = 0
+    events = []
+    for left, right in replay:
+        events = sim.step(left, right)
+        ticks += 1
+        if sim.dead or sim.complete:
+            break
+    return ticks, events
+
+
+def save_replay(replay, folder=REPLAY_DIR, keep=REPLAY_KEEP):
+    """
+    Saves a replay with the time and level in its name, deleting the oldest
+    replays in the folder past the most to keep. Returns the path saved to.
+    Keyword Arguments:
+        replay -- the replay
+        folder -- the folder to save it in
+        keep -- the most replays to keep in the folder
+    """
+    os.makedirs(folder, exist_ok=True)
+    name = "endless" if replay.level < 0 else "level{:02}".format(replay.level + 1)
+    path = os.path.join(folder, "{}-{}.replay".format(time.strftime("%Y%m%d-%H%M%S"), name))
+    replay.save(path)
+
+    # The names start with the time, so they sort oldest first
+    replays = sorted(file for file in os.listdir(folder) if file.endswith(".replay"))
+    for file in replays[:-keep]:
+        os.remove(os.path.join(folder, file))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays replays headless and prints how they ended")
+    parser.add_argument("replays", nargs="+", help="replay files to play")
+    args = parser.parse_args()
+
+    easy, medium, hard, levels = load_levels()
+    for path in args.replays:
+        replay = Replay.load(path)
+        sim = Simulation(easy, medium, hard, levels)
+        t = time.time()
+        ticks, events = run_replay(sim, replay)
+        taken = time.time() - t
+
+        if sim.dead:
+            obstacle = next(obstacle for event, obstacle in events if event == DIED)
+            result = "died on tick {} hitting the obstacle at ({}, {})".format(ticks, obstacle.x_pos, obstacle.y_pos)
+        elif sim.complete:
+            result = "completed in {} ticks".format(ticks)
+        else:
+            result = "ended after {} ticks without dying (quit)".format(ticks)
+        name = "endless (seed {})".format(replay.seed) if replay.level < 0 else levels.title(replay.level)
+        speed = ticks / TICKS_PER_SECOND / taken if taken > 0 else float("inf")
+        print("{}: {}, {}  {:.3f}s ({:.0f}x real time)".format(path, name, result, taken, speed))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""
+Profiles single runs of the game with cProfile, for finding out why a level stutters
+
+Profiling is switched on by setting the SINE_SURFER_PROFILE environment
+variable before starting the game, or by pressing F9, and covers the next run
+only (from the level starting to the player dying or finishing it). The
+profile is saved as a .prof file named after the level, for opening with
+pstats or snakeviz, and the slowest functions are logged.
+
+While it is off nothing is profiled and cProfile is not even imported, so it
+costs nothing to leave in.
+"""
+
+import os
+import re
+import time
+
+from sineplane_constants import *
+
+
+class RunProfiler:
+    """Profiles the next run once armed"""
+    def __init__(self, folder=PROFILE_DIR, top=PROFILE_TOP):
+        """
+        Keyword Arguments:
+            folder -- the folder to save the profiles in
+            top -- the number of functions in the summary
+        """
+        self.folder = folder
+        self.top = top
+        
+        self.armed = bool(os.environ.get(PROFILE_ENV))
+        self.profile = None
+        self.name = None
+        
+    def arm(self):
+        """Profiles the next run"""
+        self.armed = True
+        
+    @property
+    def running(self):
+        """True while a run is being profiled"""
+        return self.profile is not None
+        
+    def start(self, name):
+        """
+        Starts profiling, if armed
+        Keyword Arguments:
+            name -- the name of the run, used in the file name
+        """
+        if not self.armed:
+            return
+        import cProfile
+        self.armed = False
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        
+    def finish(self):
+        """
+        Stops profiling and saves the profile. Returns the path saved to and a
+        summary of the functions with the most time spent in them (and the
+        functions they call).
+        """
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        import io
+        import pstats
+        
+        os.makedirs(self.folder, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", self.name).strip("_") or "run"
+        path = os.path.join(self.folder, "{}-{}.prof".format(time.strftime("%Y%m%d-%H%M%S"), name))
+        profile.dump_stats(path)
+        
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).strip_dirs().sort_stats("cumulative").print_stats(self.top)
+        return path, summary.getvalue()
@@ -0,0 +1,208 @@
+"""
+Runs a callback at a fixed rate on top of the tkinter event loop, and
+optionally draws frames in between at a rate of their own
+"""
+
+import math
+import time
+
+# How quickly the measured tick and render times follow changes, 1 is instantly
+RENDER_SMOOTHING = 0.1
+
+
+class QualityController:
+    """
+    Picks how much drawing to leave out so a tick and a frame fit in a tick's
+    time. Level 0 draws everything and each level above leaves out more, what
+    is left out at each level is up to the caller apart from frame_ticks.
+    
+    The load is the time a tick and a frame take over the time between ticks.
+    When a tick is late or the load goes over overrun_load the level is raised,
+    at most once every settle_ticks so the new level can be measured first,
+    and once the load has stayed under headroom_load for restore_ticks it is
+    lowered by one.
+    """
+    def __init__(self, frame_ticks, overrun_load, headroom_load, settle_ticks, restore_ticks):
+        """
+        Keyword Arguments:
+            frame_ticks -- for each level, the most ticks to run between frames
+            overrun_load -- the load over which the level is raised
+            headroom_load -- the load under which the level is lowered
+            settle_ticks -- the fewest ticks between raising the level
+            restore_ticks -- the ticks the load has to stay under headroom_load to lower the level
+        """
+        self.frame_ticks = frame_ticks
+        self.overrun_load = overrun_load
+        self.headroom_load = headroom_load
+        self.settle_ticks = settle_ticks
+        self.restore_ticks = restore_ticks
+        
+        self.level = 0
+        self.since_change = 0
+        self.calm_ticks = 0
+        # Ticks run at each level, since the counts were last reset
+        self.counts = [0] * len(frame_ticks)
+        
+    def update(self, load, late, ticks):
+        """
+        Changes the level if needed, after some ticks have been run
+        Keyword Arguments:
+            load -- the measured load
+            late -- True if the ticks were run late
+            ticks -- the number of ticks run
+        """
+        self.counts[self.level] += ticks
+        self.since_change += ticks
+        if late or load > self.overrun_load:
+            self.calm_ticks = 0
+            if self.level < len(self.frame_ticks) - 1 and self.since_change >= self.settle_ticks:
+                self.level += 1
+                self.since_change = 0
+        elif load < self.headroom_load:
+            self.calm_ticks += ticks
+            if self.level > 0 and self.calm_ticks >= self.restore_ticks:
+                self.level -= 1
+                self.since_change = 0
+                self.calm_ticks = 0
+        else:
+            self.calm_ticks = 0
+            
+    def reset_counts(self):
+        """Starts counting the ticks run at each level again"""
+        self.counts = [0] * len(self.frame_ticks)
+
+
+class TickScheduler:
+    """
+    Calls a function a fixed number of times per second using root.after, so the
+    tkinter mainloop keeps handling input (and sleeping) between ticks.
+    
+    Each tick has an absolute deadline measured with time.perf_counter, so the
+    timer does not drift. If ticks are late (a slow tick, or the window being
+    dragged) the missed ticks are run back to back, up to max_catch_up at a time,
+    after which the schedule is restarted from now instead of trying to catch up forever.
+    
+    If a render function is given it is called between ticks, up to
+    max_frames_per_second times a second, with how far the time is through the
+    current tick (0 to 1) so it can draw between the last two tick states.
+    Frames are never caught up, and the frame rate drops (down to the tick
+    rate) when rendering would take more than render_load of the time, so a
+    slow machine draws less often while the ticks keep their rate.
+    
+    If a QualityController is given as well, it is updated with the tick and
+    render times, and its level can space frames out by more than one tick.
+    """
+    def __init__(self, root, ticks_per_second, callback, max_catch_up, render=None, max_frames_per_second=None, render_load=0.5, quality=None):
+        """
+        Keyword Arguments:
+            root -- the tkinter root to schedule on
+            ticks_per_second -- how often to call callback
+            callback -- the function to call every tick
+            max_catch_up -- the most late ticks to run back to back
+            render -- the function to draw a frame, given how far through the tick it is, None to not draw frames
+            max_frames_per_second -- the most frames to draw a second
+            render_load -- the most of the time rendering is allowed to take
+            quality -- the QualityController to update, None to always draw everything
+        """
+        self.root = root
+        self.interval = 1 / ticks_per_second
+        self.callback = callback
+        self.max_catch_up = max_catch_up
+        
+        self.render = render
+        if render is not None:
+            self.min_frame_interval = min(self.interval, 1 / max_frames_per_second)
+        self.render_load = render_load
+        self.frame_interval = 0
+        self.render_time = 0
+        self.next_frame = 0
+        
+        self.quality = quality
+        self.tick_time = 0
+        
+        self.running = False
+        self.deadline = 0
+        self.after_id = None
+        # Counts the starts, so a run can tell the callback restarted the schedule
+        self.starts = 0
+        
+    def start(self):
+        """Starts ticking, the first tick is run straight away"""
+        self.stop()
+        self.running = True
+        self.starts += 1
+        self.deadline = time.perf_counter()
+        self.next_frame = self.deadline
+        if self.render is not None:
+            self.frame_interval = self.min_frame_interval
+        self.run()
+        
+    def stop(self):
+        """Stops ticking, can be called from inside the callback"""
+        self.running = False
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+            
+    def run(self):
+        """Runs every tick that is due, then waits until the next one"""
+        self.after_id = None
+        
+        ticks_run = 0
+        starts = self.starts
+        now = time.perf_counter()
+        started = now
+        while self.running and now >= self.deadline and ticks_run < self.max_catch_up:
+            self.callback()
+            if self.starts != starts:
+                # Restarted from the callback, which has already scheduled its own run
+                return
+            self.deadline += self.interval
+            ticks_run += 1
+            now = time.perf_counter()
+            
+        if not self.running:
+            return
+        
+        late = ticks_run > 1
+        if now >= self.deadline:
+            # Too far behind, skip the missed ticks
+            self.deadline = now + self.interval
+            late = True
+            
+        if ticks_run and self.quality is not None:
+            self.tick_time += ((now - started) / ticks_run - self.tick_time) * RENDER_SMOOTHING
+            self.quality.update((self.tick_time + self.render_time) / self.interval, late, ticks_run)
+            
+        wake = self.deadline
+        if self.render is not None:
+            if now >= self.next_frame:
+                self.draw_frame(now)
+                now = time.perf_counter()
+            wake = min(wake, self.next_frame)
+            
+        delay = max(0, math.ceil((wake - now) * 1000))
+        self.after_id = self.root.after(delay, self.run)
+        
+    def draw_frame(self, now):
+        """
+        Draws a frame and works out when the next one should be
+        Keyword Arguments:
+            now -- the time the frame is for
+        """
+        # The last tick was due one interval before the next one
+        progress = 1 - (self.deadline - now) / self.interval
+        self.render(max(0.0, min(1.0, progress)))
+        
+        taken = time.perf_counter() - now
+        self.render_time += (taken - self.render_time) * RENDER_SMOOTHING
+        longest = self.interval
+        if self.quality is not None:
+            longest *= self.quality.frame_ticks[self.quality.level]
+        self.frame_interval = min(longest, max(self.min_frame_interval, self.render_time / self.render_load))
+        self.next_frame = now + self.frame_interval
+        
+    @property
+    def frames_per_second(self):
+        """The rate frames are being drawn at"""
+        return 1 / self.frame_interval if self.frame_interval else 0
@@ -0,0 +1,388 @@
+"""
+The game rules, without any drawing
+
+The Simulation runs one tick at a time and reports what happened as events,
+so it can be run by the GUI, or headless (tests, bots, level analysis) without
+tkinter being imported at all.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+# NOTE: sineplane_constants is imported while importing levels
+from levels import *
+from sinewave import SinWave
+from endless import endless_chunks
+from framestats import SPAWN_PHASE, MOVE_PHASE, COLLISION_PHASE, SIN_PHASE
+
+# Events returned by Simulation.step, as (event, obstacle or None) pairs
+SPAWNED = "spawned"
+REMOVED = "removed"
+DIED = "died"
+LEVEL_COMPLETE = "level complete"
+GAME_FINISHED = "game finished"
+
+TITLE_TICKS = 50 # Gives 2 seconds to display the level title
+
+
+class Plane:
+    """The player piece"""
+    def __init__(self, x_pos, y_pos):
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        
+        self.color = PLANE_COLOR
+        
+        
+class Obstacle:
+    """An obstacle that will kill the player on collision"""
+    def __init__(self, x_pos, y_pos, width, height):
+        self.world_x = x_pos
+        self.y_pos = y_pos
+        self.width = width
+        self.height = height
+        
+        # The store the obstacle is scrolling in, set when it is added
+        self.store = None
+        
+        self.color = OBSTACLE_COLOR
+        
+    @property
+    def x_pos(self):
+        """The x position on screen"""
+        if self.store is None:
+            return self.world_x
+        return self.world_x - self.store.scroll
+        
+    def intersects_with(self, plane):
+        """
+        Checks if the obstacle intersects with the player
+        Keyword Arguments:
+            plane -- The instance of plane to check if the obstacle intersects
+        """
+        if self.x_pos < plane.x_pos + PLANE_WIDTH / 2 and \
+        self.x_pos + self.width > plane.x_pos - PLANE_WIDTH / 2 and \
+        self.y_pos < plane.y_pos + PLANE_HEIGHT / 2 and \
+        self.y_pos + self.height > plane.y_pos - PLANE_HEIGHT / 2:
+            return True
+        return False
+    
+    
+class ObstacleStore:
+    """
+    The live obstacles, as parallel arrays ordered by x. Obstacles never move
+    relative to each other, so their x is kept in world coordinates and
+    scrolling all of them is a single add to the scroll offset.
+    """
+    # Expired slots at the front are only deleted once there are this many
+    COMPACT_AFTER = 64
+    
+    def __init__(self):
+        self.scroll = 0
+        
+        # Slots before head have scrolled off screen
+        self.head = 0
+        self.xs = array("q")
+        self.ys = array("q")
+        self.widths = array("q")
+        self.heights = array("q")
+        self.obstacles = []
+        
+    def __len__(self):
+        return len(self.xs) - self.head
+    
+    def __iter__(self):
+        return iter(self.obstacles[self.head:])
+    
+    def add(self, obstacle):
+        """
+        Adds an obstacle, keeping the arrays ordered by x
+        Keyword Arguments:
+            obstacle -- the new obstacle, with its x_pos on screen
+        """
+        obstacle.world_x += self.scroll
+        obstacle.store = self
+        
+        index = bisect_right(self.xs, obstacle.world_x, self.head)
+        self.xs.insert(index, obstacle.world_x)
+        self.ys.insert(index, obstacle.y_pos)
+        self.widths.insert(index, obstacle.width)
+        self.heights.insert(index, obstacle.height)
+        self.obstacles.insert(index, obstacle)
+        
+    def advance(self, distance):
+        """
+        Scrolls every obstacle left
+        Keyword Arguments:
+            distance -- how far to scroll, in pixels
+        """
+        self.scroll += distance
+        
+    def expire(self):
+        """Removes and returns the obstacles that are now off the left of the screen"""
+        xs, widths, scroll = self.xs, self.widths, self.scroll
+        # The arrays are ordered by left edge but obstacles go off screen by
+        # their right edge, so a narrow obstacle can go before a wide one in
+        # front of it. Only the obstacles whose left edge is off screen can have gone
+        end = bisect_left(xs, scroll, self.head)
+        gone = [i for i in range(self.head, end) if xs[i] + widths[i] < scroll]
+        if not gone:
+            return ()
+        expired = [self.obstacles[i] for i in gone]
+        
+        # The ones at the front are skipped over, any behind a wider obstacle are deleted
+        front = 0
+        while front < len(gone) and gone[front] == self.head:
+            self.head += 1
+            front += 1
+        for i in reversed(gone[front:]):
+            for column in (self.xs, self.ys, self.widths, self.heights, self.obstacles):
+                del column[i]
+        
+        if self.head >= self.COMPACT_AFTER and self.head * 2 >= len(xs):
+            for column in (self.xs, self.ys, self.widths, self.heights, self.obstacles):
+                del column[:self.head]
+            self.head = 0
+        return expired
+    
+    def in_column(self, left, right):
+        """
+        Returns the slots of the obstacles whose x span overlaps a column of the screen
+        Keyword Arguments:
+            left, right -- the screen x of the edges of the column
+        """
+        xs, widths = self.xs, self.widths
+        left += self.scroll
+        # The rest of the arrays are further right
+        end = bisect_left(xs, right + self.scroll, self.head)
+        return [i for i in range(self.head, end) if xs[i] + widths[i] > left]
+    
+    def collide(self, left, top, right, bottom):
+        """
+        Returns the first obstacle overlapping a box on screen, or None
+        Keyword Arguments:
+            left, top, right, bottom -- the edges of the box
+        """
+        ys, heights = self.ys, self.heights
+        for i in self.in_column(left, right):
+            if ys[i] < bottom and ys[i] + heights[i] > top:
+                return self.obstacles[i]
+        return None
+    
+    
+class Simulation:
+    """
+    The state of a game: the plane, the sin wave, the obstacles and where
+    the game is up to in the current level.
+    """
+    def __init__(self, easy_chunks, medium_chunks, hard_chunks, levels):
+        self.easy_chunks = easy_chunks
+        self.medium_chunks = medium_chunks
+        self.hard_chunks = hard_chunks
+        
+        self.levels = levels
+        
+        self.run_mode = None
+        self.current_level = -1
+        # Kept here, as the levels only keep the last few levels used
+        self.level = None
+        
+        self.plane = Plane(PLANE_STARTING_X, WINDOW_HEIGHT / 2)
+        self.sin = SinWave()
+        self.obstacles = ObstacleStore()
+        
+        self.chunk_tick = 0
+        self.chunk = None
+        # The chunks still to come in an endless run
+        self.endless = None
+        # The next obstacle in the chunk to create
+        self.cursor = 0
+        
+        self.dead = False
+        self.complete = False
+        
+        # FrameStats to time the parts of each step in, None to not time them
+        self.stats = None
+        
+    @property
+    def showing_title(self):
+        """True while the level title is being shown, before the obstacles start"""
+        return self.chunk_tick < 0
+        
+    def start_level(self, level_index):
+        """
+        Resets the game to the start of a classic level
+        Keyword Arguments:
+            level_index -- the index of the level in levels
+        """
+        self.run_mode = "Classic"
+        self.current_level = level_index
+        self.level = self.levels[level_index]
+        self.level.index = -1
+        self.chunk_tick = -TITLE_TICKS
+        self.reset()
+        
+    def start_endless(self, seed=None):
+        """
+        Resets the game to the start of an endless run
+        Keyword Arguments:
+            seed -- the seed for the order of chunks, None for a different run every time
+        """
+        self.run_mode = "Endless"
+        self.current_level = -1
+        self.level = None
+        # Chunks are built ahead on the level prefetch thread, when there is one
+        executor = self.levels.background() if isinstance(self.levels, LevelRegistry) else None
+        self.endless = endless_chunks(self.easy_chunks, self.medium_chunks, self.hard_chunks, seed, executor)
+        self.chunk_tick = 0
+        self.reset()
+        
+    def reset(self):
+        """Resets the obstacles, plane and sin wave for a new game"""
+        self.obstacles = ObstacleStore()
+        self.dead = False
+        self.complete = False
+        self.sin.exponent = 0
+        
+        # A workaround to get the sin wave starting correctly
+        self.calculate_sin(True, False)
+        
+    def step(self, left, right):
+        """
+        Runs one tick of the game and returns the list of events that happened
+        Keyword Arguments:
+            left -- True if the left key is held (squashes the wave)
+            right -- True if the right key is held (stretches the wave)
+        """
+        events = []
+        stats = self.stats
+        
+        # Create new obstacles
+        
+        # Using chunks
+        if self.run_mode == "Classic":
+            if self.chunk_tick == 0:
+                if self.level.chunks_left():
+                    self.start_chunk(self.level.next_chunk())
+                else:
+                    # Level is complete when all obstacles are off screen
+                    if len(self.obstacles) > 0:
+                        self.chunk_tick = -1
+                    else:
+                        # FINISHED!!
+                        self.complete = True
+                        if self.current_level == len(self.levels) - 1:
+                            # Finished whole game
+                            events.append((GAME_FINISHED, None))
+                            return events
+                        events.append((LEVEL_COMPLETE, None))
+                
+            if self.chunk_tick > 0:
+                self.spawn_signals(events)
+            
+            # Allowing for title screen => not mod the chunk length if the chink tick is below zero
+            if self.chunk_tick >= 0:    
+                self.chunk_tick = (self.chunk_tick + 1) % self.chunk.length
+            else:
+                self.chunk_tick += 1
+            
+        elif self.run_mode == "Endless":
+            if self.chunk_tick == 0:
+                self.start_chunk(next(self.endless))
+                
+            self.spawn_signals(events)
+                
+            self.chunk_tick = (self.chunk_tick + 1) % self.chunk.length
+            
+        if stats is not None:
+            stats.mark(SPAWN_PHASE)
+        
+        # If chunk_tick is below zero then the title is being displayed, nothing moves
+        if self.chunk_tick >= 0:
+            # Move obstacles (left/right)
+            self.obstacles.advance(MOVESPEED)
+            for obstacle in self.obstacles.expire():
+                events.append((REMOVED, obstacle))
+            if stats is not None:
+                stats.mark(MOVE_PHASE)
+            
+            # Set plane position to starting sin curve height 
+            # (sin curve calculation is correct, saves doing all the maths twice,
+            # and eliminates any mathematical errors/rounding errors etc.)
+            self.plane.y_pos = self.sin.height
+            
+            # Detect collisions
+            obstacle = self.find_collision()
+            if stats is not None:
+                stats.mark(COLLISION_PHASE)
+            if obstacle is not None:
+                self.dead = True
+                events.append((DIED, obstacle))
+                return events
+            
+            # Recalcculate sin line
+            self.calculate_sin(left, right)
+            if stats is not None:
+                stats.mark(SIN_PHASE)
+            
+        return events
+    
+    def obstacles_at_plane(self):
+        """Returns the obstacles whose x span overlaps the plane's column"""
+        slots = self.obstacles.in_column(self.plane.x_pos - PLANE_WIDTH / 2, self.plane.x_pos + PLANE_WIDTH / 2)
+        return [self.obstacles.obstacles[i] for i in slots]
+    
+    def find_collision(self):
+        """Returns the obstacle the plane has hit, or None"""
+        return self.obstacles.collide(self.plane.x_pos - PLANE_WIDTH / 2, self.plane.y_pos - PLANE_HEIGHT / 2,
+                                      self.plane.x_pos + PLANE_WIDTH / 2, self.plane.y_pos + PLANE_HEIGHT / 2)
+    
+    def start_chunk(self, chunk):
+        """
+        Moves the game onto a new chunk
+        Keyword Arguments:
+            chunk -- the chunk to play
+        """
+        self.chunk = chunk
+        self.cursor = 0
+        
+    def spawn_signals(self, events):
+        """
+        Creates all the obstacles the chunk has for this tick
+        Keyword Arguments:
+            events -- the event list to report the new obstacles in
+        """
+        chunk = self.chunk
+        # The chunk's obstacles are sorted by tick, so the cursor is always at
+        # the next one due
+        while self.cursor < len(chunk.ticks) and chunk.ticks[self.cursor] == self.chunk_tick:
+            i = self.cursor
+            self.spawn_obstacle(events, chunk.xs[i], chunk.ys[i], chunk.widths[i], chunk.heights[i])
+            self.cursor += 1
+        
+    def spawn_obstacle(self, events, x_pos, y_pos, width, height):
+        """
+        Creates an obstacle
+        Keyword Arguments:
+            events -- the event list to report the new obstacle in
+            x_pos, y_pos, width, height -- the position and size of the obstacle
+        """
+        obstacle = Obstacle(x_pos, y_pos, width, height)
+        self.obstacles.add(obstacle)
+        events.append((SPAWNED, obstacle))
+        
+    def calculate_sin(self, left, right):
+        """
+        Calculates the positions of the sin curve
+        Keyword Arguments:
+            left -- True if the wave is being squashed
+            right -- True if the wave is being stretched
+        """
+        # Recalcculate sin line
+        if right:
+            self.sin.change_period(1)
+        if left:
+            self.sin.change_period(-1)
+
+        # Update sin angle
+        self.sin.advance()
@@ -3,70 +3,86 @@
 
    The main file for the program.
 
-   A 'Level' is broken up into 'Chunks' - a ten second block of
-   obstacles. Each level contains a few chunks, and each chunk
-   contains a dictionary with 250 entries - one for each of 25
-   ticks per second for 10 seconds - when the current tick matches
-   one in the chunk dictionary, the specified obstacle in the chunk
-   dictionary is created on screen.
+   A 'Level' is broken up into 'Chunks' - a block of obstacles,
+   usually 250 ticks (10 seconds at 25 ticks per second) long. Each
+   level contains a few chunks, and each chunk lists the obstacles
+   to create sorted by tick - when the current tick reaches the next
+   one in the chunk, it (and any others on the same tick) is created
+   on screen.
 
    For the level title screens, the tick number is set to -50 ->
    allowing 2 seconds for the title to be displayed. The rest of
    the code runs when the tick counter reaches 0.
 
-   Eventually, an endless mode will be implemented by taking a
-   random selection of the level chunks and simply putting them
-   together.
+   Endless mode takes a random selection of the level chunks and
+   simply puts them together, picking harder chunks the longer the
+   run goes on.
 """
-from tkinter import *
-# NOTE: sineplane_constants is imported while importing levels
-from levels import *
-import math
 import time
+STARTED = time.time() # For timing how long the main menu and music take to start
+
+from tkinter import *
+# NOTE: sineplane_constants and levels are imported while importing simulation
+from simulation import *
+from scheduler import TickScheduler, QualityController
+from sinewave import SIN_PHASE_MASK
+from replay import Replay, start_replay, save_replay
+from runprofile import RunProfiler
+from framestats import FrameStats, DRAW_OBSTACLES_PHASE, DRAW_SIN_PHASE, DRAW_PLANE_PHASE, UPDATE_PHASE
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
 import random
-from PIL import Image, ImageTk
-import pygame
+# NOTE: PIL and pygame are only imported when the logo and music are loaded
+
+IMPORTED = time.time()
+
+# How long each part of starting up took, for --startup-report
+startup_times = {}
+
+
+def startup_phase(name, t):
+    """
+    Records how long part of starting up took
+    Keyword Arguments:
+        name -- the name of the part
+        t -- the time it started
+    """
+    startup_times[name] = time.time() - t
+
+
+def load_logo():
+    """Opens and decodes the logo image (run in the background)"""
+    log("Loading logo")
+    t = time.time()
+    from PIL import Image
+    logo = Image.open(LOGO_PATH)
+    logo.load()
+    log("Successfully loaded logo")
+    log("Time taken: {}s".format(time.time() - t))
+    startup_phase("Logo loading (background)", t)
+    return logo
+
+
+def load_music():
+    """
+    Starts the mixer and opens the music for streaming (run in the background).
+    The music is decoded a buffer at a time as it plays rather than all at once,
+    so it can be an OGG as well as a WAV.
+    """
+    log("Loading music")
+    t = time.time()
+    import pygame
+    pygame.mixer.pre_init(44100, 16, 2, MUSIC_BUFFER_SIZE) #frequency, size, channels, buffersize
+    pygame.mixer.init()
+    path = next((path for path in MUSIC_PATHS if os.path.exists(path)), MUSIC_PATHS[-1])
+    pygame.mixer.music.load(path)
+    log("Successfully loaded music")
+    log("Time taken: {}s".format(time.time() - t))
+    startup_phase("Music loading (background)", t)
+    return pygame.mixer.music
 
 
-class Plane:
-    """The player piece"""
-    def __init__(self, x_pos, y_pos):
-        self.x_pos = x_pos
-        self.y_pos = y_pos
-        
-        self.color = PLANE_COLOR
-        
-        
-class Obstacle:
-    """An obstacle that will kill the player on collision"""
-    def __init__(self, x_pos, y_pos, width, height):
-        self.x_pos = x_pos
-        self.y_pos = y_pos
-        self.width = width
-        self.height = height
-        
-        self.color = OBSTACLE_COLOR
-        
-    def intersects_with(self, plane):
-        """
-        Checks if the obstacle intersects with the player
-        Keyword Arguments:
-            plane -- The instance of plane to check if the obstacle intersects
-        """
-        if self.x_pos < plane.x_pos + PLANE_WIDTH / 2 and \
-        self.x_pos + self.width > plane.x_pos - PLANE_WIDTH / 2 and \
-        self.y_pos < plane.y_pos + PLANE_HEIGHT / 2 and \
-        self.y_pos + self.height > plane.y_pos - PLANE_HEIGHT / 2:
-            return True
-        return False
-    
-    
-class SinWave:
-    """The sin wave showing trajectory"""
-    def __init__(self):
-        self.angle = 0
-        self.period = SIN_STARTING_PERIOD
-    
 class LevelSelectButton:
     """The buttons in the classic menu screen for selecting level"""
     def __init__(self, level_number, unlocked, x_pos, y_pos, width, height, bg, fg, font, canvas):
@@ -94,7 +110,7 @@ class LevelSelectButton:
 
 class GUI:
     """Graphics class"""
-    def __init__(self, parent, easy_chunks, medium_chunks, hard_chunks, levels):
+    def __init__(self, parent, easy_chunks, medium_chunks, hard_chunks, levels, startup_report=False, frame_stats_path=None, max_fps=RENDER_MAX_FPS):
         self.parent = parent
         
         # Overriding the X press
@@ -105,50 +121,129 @@ class GUI:
         self.hard_chunks = hard_chunks
         
         self.levels = levels
+        self.max_fps = max_fps
+        
+        # Profiles a run when asked to, with the environment variable or F9
+        self.profiler = RunProfiler()
+        
+        # Prints how long starting up took then quits, once the menu is shown and the assets are loaded
+        self.startup_report = startup_report
+        self.menu_shown = False
              
-        # Logo image
-        log("Loading logo")
+        # The logo and music load in the background so the menu can be shown straight away,
+        # the logo is swapped in and the music started (streamed, looping) when they are ready
+        self.pil_logo = None
+        self.logo_image = None
+        self.music = None
+        self.assets = ThreadPoolExecutor(max_workers=2)
+        self.logo_future = self.assets.submit(load_logo)
+        self.music_future = self.assets.submit(load_music)
+        
         t = time.time()
-        self.pil_logo = Image.open("assets\images\sine_surfer_logo.png")
-        self.logo_image = ImageTk.PhotoImage(self.pil_logo)
-        log("Successfully loaded logo")
-        log("Time taken: {}s".format(time.time() - t))
+        self.setup()
+        startup_phase("Main menu setup", t)
+        
+        # Frame timings, only collected once the HUD is first shown (F3) or a file to save them to is given
+        self.frame_stats = None
+        self.frame_stats_path = frame_stats_path or FRAME_STATS_PATH
+        self.show_hud = False
+        if frame_stats_path:
+            self.start_frame_stats()
+        self.parent.after(ASSET_POLL_INTERVAL, self.check_assets)
+        self.parent.after_idle(self.first_frame, time.time())
+        
+    def first_frame(self, t):
+        """
+        Logs how long the program took to show the main menu
+        Keyword Arguments:
+            t -- the time the main menu was set up
+        """
+        startup_phase("First frame", t)
+        startup_times["Total to first frame"] = time.time() - STARTED
+        log("Main menu shown")
+        log("Time taken: {}s".format(startup_times["Total to first frame"]))
+        self.menu_shown = True
+        self.finish_startup_report()
+        
+    def check_assets(self):
+        """Uses the logo and music once they have loaded in the background"""
+        if self.logo_future is not None and self.logo_future.done():
+            try:
+                self.pil_logo = self.logo_future.result()
+                # Tk images have to be made on the Tk thread
+                from PIL import ImageTk
+                self.logo_image = ImageTk.PhotoImage(self.pil_logo)
+                self.logo.config(image=self.logo_image)
+            except Exception as e:
+                log("Error loading logo: {}".format(e))
+            self.logo_future = None
+            
+        if self.music_future is not None and self.music_future.done():
+            try:
+                self.music = self.music_future.result()
+                self.music.play(loops=-1)
+                startup_times["Total to music starting"] = time.time() - STARTED
+                log("Music started")
+                log("Time taken: {}s".format(startup_times["Total to music starting"]))
+            except Exception as e:
+                log("Error loading music: {}".format(e))
+            self.music_future = None
+            
+        if self.logo_future is not None or self.music_future is not None:
+            self.parent.after(ASSET_POLL_INTERVAL, self.check_assets)
+        else:
+            self.assets.shutdown(wait=False)
+            self.finish_startup_report()
+            
+    def finish_startup_report(self):
+        """
+        Prints the --startup-report and quits, if it was asked for and
+        starting up has finished
+        """
+        if not self.startup_report or not self.menu_shown or self.logo_future is not None or self.music_future is not None:
+            return
         
-        # Music
-        log("Loading music")
+        # Chunks and levels are only built when they are played, so time building all of them
+        t = time.time()
+        for number in range(self.levels.chunk_count):
+            self.levels.build_chunk(number)
+        startup_phase("Chunk creation (all, when played)", t)
         t = time.time()
-        pygame.mixer.pre_init(44100, 16, 2, 4096) #frequency, size, channels, buffersize
-        pygame.init() #turn all of pygame on.        
-        self.music = pygame.mixer.Sound(file="assets\music\sine_surfer_music.wav")
-        self.music.play(loops=-1)
-        log("Successfully loaded music")
-        log("Time taken: {}s".format(time.time() - t))        
+        for index in range(len(self.levels)):
+            self.levels.build_level(index)
+        startup_phase("Level creation (all, when played)", t)
         
-        self.setup()
+        print("Startup report")
+        # The background loading overlaps the rest, so it is listed last
+        for name, seconds in sorted(startup_times.items(), key=lambda item: "(background)" in item[0]):
+            print("  {:<40}{:8.1f}ms".format(name, seconds * 1000))
+        self.exit_button_press()
         
         
     def setup(self):
         """Sets up the starting variables for the game"""
         self.parent.title(WINDOW_TITLE)
         
-        # Game variables
-        self.run_mode = None
-        self.current_level = -1
-        self.dead = False
-        
-        # Setting up the player
-        self.plane = Plane(PLANE_STARTING_X, WINDOW_HEIGHT / 2)
-        
-        # Setting up obstacles
-        self.obstacles = []
-        
-        # Setting up sin wave
-        self.sin = SinWave()
+        # Game state (plane, obstacles, sin wave, level progress)
+        self.sim = Simulation(self.easy_chunks, self.medium_chunks, self.hard_chunks, self.levels)
         
         # Setting up the drawing canvas
         self.canvas = Canvas(self.parent, width=WINDOW_WIDTH, height=WINDOW_HEIGHT, bg=CANVAS_BACKGROUND_COLOR, highlightthickness=0)
         self.canvas.pack(padx=0, pady=0, ipadx=0, ipady=0)
         
+        # Cuts back on drawing when a tick and a frame do not fit in a tick's time
+        self.quality = QualityController(QUALITY_FRAME_TICKS, QUALITY_OVERRUN_LOAD, QUALITY_HEADROOM_LOAD,
+                                         QUALITY_SETTLE_TICKS, QUALITY_RESTORE_TICKS)
+        
+        # Runs the game ticks, and draws frames between them
+        self.scheduler = TickScheduler(self.parent, TICKS_PER_SECOND, self.game_loop, MAX_CATCH_UP_TICKS,
+                                       render=self.render, max_frames_per_second=self.max_fps, render_load=RENDER_LOAD,
+                                       quality=self.quality)
+        
+        # Every run is recorded, unless a replay is being played back
+        self.replay = None
+        self.playback = None
+        
         # Binding key presses
         self.right = False
         self.left = False
@@ -161,25 +256,48 @@ class GUI:
         self.parent.bind("<KeyRelease-Left>", self.left_release)
         self.parent.bind("<KeyRelease-Right>", self.right_release)  
         self.parent.bind("<Escape>", self.escape)
+        self.parent.bind("<F3>", self.toggle_hud)
+        self.parent.bind("<F9>", self.arm_profiler)
         
-        # Setting up chunk ticks
-        self.chunk_tick = 0
-        self.chunk = None
+        # Long lived canvas items for the game screen
+        self.reset_canvas_items()
         
         # Setting up level select buttons
         self.create_level_buttons()
-        self.current_level = -1
-        self.complete = False
         self.finished_game = False
         
-        self.back_to_main_menu_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="BACK TO MAIN MENU")
-        
-        # Logo
-        self.logo = Label(self.canvas, image=self.logo_image, highlightthickness=0, bd=0)
+        # Menu buttons and labels
+        self.create_menu_widgets()
         
         # Loads the main screen
         self.main_screen()
         
+    def create_menu_widgets(self):
+        """
+        Creates the widgets for the menu screens. They are only created once and
+        put back on the canvas each time a screen is shown, so the number of
+        widgets does not grow however many times the screens are visited.
+        """
+        # Logo, the title is shown in its place until the image has loaded
+        self.logo = Label(self.canvas, text=WINDOW_TITLE.upper(), font=TITLE_FONT, fg=TITLE_FG, bg=TITLE_BG, highlightthickness=0, bd=0)
+        
+        # Main screen
+        self.play_classic_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="PLAY")
+        self.play_classic_button.bind("<Button-1>", self.play_classic_button_press)
+        self.play_endless_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="ENDLESS")
+        self.play_endless_button.bind("<Button-1>", self.play_endless_button_press)
+        self.how_to_play_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="HOW TO PLAY")
+        self.how_to_play_button.bind("<Button-1>", self.how_to_play_button_press)
+        self.exit_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="EXIT")
+        self.exit_button.bind("<Button-1>", self.exit_button_press)
+        
+        # How to play screen
+        self.help_label = Label(self.canvas, font=HELP_LABEL_FONT, bg=HELP_LABEL_BG, fg=HELP_LABEL_FG, highlightthickness=0, bd=0, text="Use the left/right arrow keys, or a/d keys to adjust your trajectory to make sure you don't collide with any of the white obstacles. \n\n\nPressing the Escape key while in a level will take you back to the level select screen.\n\n\nGood Luck!", wraplength = WINDOW_WIDTH-100, justify=LEFT)
+        
+        # How to play and classic menu screens
+        self.back_to_main_menu_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="BACK TO MAIN MENU")
+        self.back_to_main_menu_button.bind("<Button-1>", self.main_screen)
+        
     def main_screen(self, event=None):
         """Sets up the starting screen for the game"""
         self.canvas.delete("all")
@@ -188,21 +306,15 @@ class GUI:
         self.canvas.create_window((WINDOW_WIDTH) / 2, LOGO_Y, window=self.logo)
         
         # Classic button
-        self.play_classic_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="PLAY")
-        self.play_classic_button.bind("<Button-1>", self.play_classic_button_press)
+        self.canvas.create_window((WINDOW_WIDTH) / 2 - START_MENU_BUTTON_PAIR_OFFSET, START_MENU_BUTTON_STARTING_Y_POS + START_MENU_BUTTON_SPACING, window=self.play_classic_button, width=START_MENU_BUTTON_WIDTH, height=START_MENU_BUTTON_HEIGHT)
 
-        self.canvas.create_window((WINDOW_WIDTH) / 2, START_MENU_BUTTON_STARTING_Y_POS + START_MENU_BUTTON_SPACING, window=self.play_classic_button, width=START_MENU_BUTTON_WIDTH, height=START_MENU_BUTTON_HEIGHT)
+        # Endless button
+        self.canvas.create_window((WINDOW_WIDTH) / 2 + START_MENU_BUTTON_PAIR_OFFSET, START_MENU_BUTTON_STARTING_Y_POS + START_MENU_BUTTON_SPACING, window=self.play_endless_button, width=START_MENU_BUTTON_WIDTH, height=START_MENU_BUTTON_HEIGHT)
 
         # How to play button
-        self.how_to_play_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="HOW TO PLAY")
-        self.how_to_play_button.bind("<Button-1>", self.how_to_play_button_press)
-        
         self.canvas.create_window((WINDOW_WIDTH) / 2, START_MENU_BUTTON_STARTING_Y_POS + 2 * START_MENU_BUTTON_SPACING, window=self.how_to_play_button, width=START_MENU_BUTTON_WIDTH, height=START_MENU_BUTTON_HEIGHT)         
         
         # Exit button
-        self.exit_button = Label(self.canvas, bg=START_MENU_BUTTON_BACKGROUND_COLOR, font=START_MENU_BUTTON_FONT, fg=START_MENU_BUTTON_TEXT_COLOR, text="EXIT")
-        self.exit_button.bind("<Button-1>", self.exit_button_press)
-        
         self.canvas.create_window((WINDOW_WIDTH) / 2, START_MENU_BUTTON_STARTING_Y_POS + 3 * START_MENU_BUTTON_SPACING, window=self.exit_button, width=START_MENU_BUTTON_WIDTH, height=START_MENU_BUTTON_HEIGHT)            
 
 
@@ -217,7 +329,18 @@ class GUI:
         
     def exit_button_press(self, event=None):
         """Quits the game"""
-        self.music.stop()
+        self.scheduler.stop()
+        if self.profiler.running:
+            self.finish_profile()
+        if self.frame_stats is not None:
+            try:
+                self.frame_stats.dump(self.frame_stats_path)
+                log("Frame timings saved to {}".format(self.frame_stats_path))
+            except OSError as e:
+                log("Error saving frame timings: {}".format(e))
+        if self.music is not None:
+            self.music.stop()
+        self.assets.shutdown(wait=False)
         self.parent.destroy()
         
         
@@ -230,18 +353,14 @@ class GUI:
         self.canvas.create_window((WINDOW_WIDTH) / 2, LOGO_CLASSIC_Y, window=self.logo)  
         
         # Help Menu Label
-        self.help_label = Label(self.canvas, font=HELP_LABEL_FONT, bg=HELP_LABEL_BG, fg=HELP_LABEL_FG, highlightthickness=0, bd=0, text="Use the left/right arrow keys, or a/d keys to adjust your trajectory to make sure you don't collide with any of the white obstacles. \n\n\nPressing the Escape key while in a level will take you back to the level select screen.\n\n\nGood Luck!", wraplength = WINDOW_WIDTH-100, justify=LEFT)
         self.canvas.create_window((WINDOW_WIDTH) / 2, HELP_LABEL_Y, window=self.help_label, width=WINDOW_WIDTH-100)
         
         # Back to main menu button
-        self.back_to_main_menu_button.bind("<Button-1>", self.main_screen)
         self.canvas.create_window(BACK_X, BACK_Y, width=BACK_WIDTH, height=BACK_HEIGHT, window = self.back_to_main_menu_button)        
         
 
     def play_classic_button_press(self, event=None):
         """Sets up the classic menu screen"""
-        self.run_mode = "Classic"
-        
         # Sets up the screen
         self.canvas.delete("all")
         
@@ -264,7 +383,6 @@ class GUI:
                 
             
         # Back to main menu button
-        self.back_to_main_menu_button.bind("<Button-1>", self.main_screen)
         self.canvas.create_window(BACK_X, BACK_Y, width=BACK_WIDTH, height=BACK_HEIGHT, window = self.back_to_main_menu_button)
         
 
@@ -274,7 +392,21 @@ class GUI:
         Keyword Arguments:
             event -- the tkinter event parameter automatically passed for some callbacks, creates error safety
         """
-        self.run_mode = "Endless"
+        seed = random.getrandbits(32)
+        self.sim.start_endless(seed)
+        self.replay = Replay.start(self.sim, seed)
+        self.run_game()
+        
+        
+    def play_replay(self, replay):
+        """
+        Plays a recorded run back on the canvas, at normal speed
+        Keyword Arguments:
+            replay -- the Replay to play
+        """
+        start_replay(self.sim, replay)
+        self.replay = None
+        self.playback = iter(replay)
         self.run_game()
     
         
@@ -322,7 +454,65 @@ class GUI:
         Keyword Arguments:
             event -- the tkinter event parameter automatically passed for some callbacks, creates error safety
         """
-        self.dead = True
+        self.sim.dead = True
+        
+        
+    def toggle_hud(self, event=None):
+        """
+        Shows or hides the frame timing HUD, timing starts the first time it is shown
+        Keyword Arguments:
+            event -- the tkinter event parameter automatically passed for some callbacks, creates error safety
+        """
+        self.show_hud = not self.show_hud
+        if self.frame_stats is None:
+            self.start_frame_stats()
+        if not self.show_hud and self.hud_item is not None:
+            self.canvas.delete(self.hud_item)
+            self.hud_item = None
+            
+            
+    def arm_profiler(self, event=None):
+        """
+        Profiles the next run
+        Keyword Arguments:
+            event -- the tkinter event parameter automatically passed for some callbacks, creates error safety
+        """
+        self.profiler.arm()
+        log("Profiling the next run")
+        
+        
+    def finish_profile(self):
+        """Saves the profile of the run that has just ended, and logs the slowest functions"""
+        try:
+            path, summary = self.profiler.finish()
+            log("Profile saved to {}".format(path))
+            log(summary)
+        except OSError as e:
+            log("Error saving profile: {}".format(e))
+            
+            
+    def start_frame_stats(self):
+        """Starts timing every frame"""
+        self.frame_stats = FrameStats()
+        self.sim.stats = self.frame_stats
+        
+        
+    def log_quality(self):
+        """Logs how much of the last game was played at each quality level, then starts counting again"""
+        counts = self.quality.counts
+        total = sum(counts)
+        if total:
+            log("Quality levels used: " + ", ".join("{} {:.1%}".format(name, count / total)
+                                                    for name, count in zip(QUALITY_LEVEL_NAMES, counts) if count))
+        self.quality.reset_counts()
+        
+        
+    def update_hud(self):
+        """Shows the latest frame timings on the HUD"""
+        if self.hud_item is None:
+            self.hud_item = self.canvas.create_text(HUD_X, HUD_Y, anchor=NW, font=HUD_FONT, fill=HUD_COLOR)
+        self.canvas.itemconfigure(self.hud_item, text="{}  quality: {}".format(self.frame_stats.summary(), QUALITY_LEVEL_NAMES[self.quality.level]))
+        self.canvas.tag_raise(self.hud_item)
         
         
     def create_level_buttons(self):
@@ -331,7 +521,7 @@ class GUI:
         """
         # self, level_number, x_pos, y__pos, width, height, bg, fg, font, canvas):
         self.level_buttons = []
-        for i in range(NUMBER_OF_LEVELS):
+        for i in range(len(self.levels)):
             self.level_buttons.append(LevelSelectButton(i + 1, 
                                                         False, 
                                                         CLASSIC_MENU_BUTTON_X + (i % 10) * CLASSIC_MENU_BUTTON_SPACING,
@@ -360,192 +550,223 @@ class GUI:
             level = event.widget.id_no
 
         if self.level_buttons[level - 1].unlocked:
-            # Resetting obstacles
-            self.obstacles = []
-                
-            self.levels[self.current_level].index = -1
-                
-            self.current_level = level - 1
-            self.dead = False
-            self.complete = False
-            self.sin.period = 800
-            self.chunk_tick = -50 # Gives 2 seconds to display text
+            self.sim.start_level(level - 1)
+            self.replay = Replay.start(self.sim)
+            # Have the next level built by the time this one is finished
+            self.levels.prefetch(level)
             self.run_game()
-            
-        if self.complete and self.current_level < 19:
-            self.level_select_press(level=self.current_level + 2)
-        if self.dead:
-            self.play_classic_button_press()
+    
+    
+    def reset_canvas_items(self):
+        """
+        Clears the canvas and forgets the game screen items, they are recreated
+        the next time they are needed
+        """
+        self.canvas.delete("all")
+        self.title_item = None
+        self.plane_item = None
+        self.sin_item = None
+        self.hud_item = None
+        self.obstacle_items = {}
+        self.remember_state()
+        # The scroll the obstacle items are drawn at
+        self.drawn_scroll = self.sim.obstacles.scroll
+        
+        
+    def remember_state(self):
+        """Keeps the positions from before a tick, for drawing between it and the next"""
+        self.previous_scroll = self.sim.obstacles.scroll
+        self.previous_phase = self.sim.sin.phase
+        self.previous_y = self.sim.plane.y_pos
+    
+    
+    def create_game_items(self):
+        """Creates the plane and sin wave canvas items, which are then moved every tick"""
+        if self.sim.level is None or not self.sim.level.blind:
+            self.sin_item = self.canvas.create_line(0, 0, 0, 0, fill=SIN_COLOR)
+        
+        # Plane is created last so it is always on the top
+        self.plane_item = self.canvas.create_rectangle(0, 0, 0, 0, fill=self.sim.plane.color)
+        
+        
+    def create_obstacle_item(self, obstacle):
+        """
+        Creates the canvas item for a new obstacle
+        Keyword Arguments:
+            obstacle -- the obstacle to draw
+        """
+        # Placed where the other obstacle items are drawn, which can be behind the simulation
+        x_pos = obstacle.world_x - self.drawn_scroll
+        item = self.canvas.create_rectangle(x_pos, obstacle.y_pos, x_pos + obstacle.width, obstacle.y_pos + obstacle.height, fill=obstacle.color, width=0, tags="obstacle")
+        # Obstacles are kept below the sin wave and the plane
+        self.canvas.tag_lower(item)
+        self.obstacle_items[obstacle] = item
     
     
     def run_game(self, event=None):
         """Main run loop"""
-        self.sin.period = SIN_STARTING_PERIOD
-
-        # A workaround to get the sin wave starting correctly
-        self.left_press()
-        self.calculate_sin()
-        self.left_release()
+        self.reset_canvas_items()
+        
+        if self.profiler.armed:
+            self.profiler.start("Endless" if self.sim.run_mode == "Endless" else self.sim.level.title)
 
-        # The main run loop
-        while not self.dead and not self.complete and not self.finished_game:
-            #print(self.chunk_tick)
-            t = time.time()
+        # Ticks are run by the scheduler from the tkinter mainloop
+        self.scheduler.start()
+        
+        
+    def game_loop(self):
+        """Runs once per tick while a game is running, ends the game when it is over"""
+        # Finishing the game only ends classic runs, endless runs and replays can still be played
+        finished = self.finished_game and self.sim.run_mode == "Classic" and self.playback is None
+        if self.sim.dead or self.sim.complete or finished:
+            self.scheduler.stop()
+            self.game_over()
+        else:
             self.tick()
-            # Making sure that each tick is only 0.04 seconds (25 fps)
-            t2 = (time.time() - t)
-            if t2 < 0.04:
-                time.sleep(0.04 - t2)
-                
-        if self.run_mode == "Endless":
+            
+            
+    def game_over(self):
+        """Moves on to the next screen (or level) once a game has ended"""
+        if self.profiler.running:
+            self.finish_profile()
+        if self.replay is not None:
+            try:
+                log("Replay saved to {}".format(save_replay(self.replay)))
+            except OSError as e:
+                log("Error saving replay: {}".format(e))
+            self.replay = None
+        self.log_quality()
+            
+        if self.playback is not None:
+            # Finished playing back a replay
+            self.playback = None
+            self.main_screen()
+        elif self.sim.run_mode == "Endless":
             # Has died in survival mode, handle it here
             self.main_screen()
+        else:
+            if self.sim.complete and self.sim.current_level < len(self.levels) - 1:
+                self.level_select_press(level=self.sim.current_level + 2)
+            if self.sim.dead:
+                self.play_classic_button_press()
                 
         
-            
-            
     def tick(self):
-        """Runs every tick, updates canvas, does calculations, detects collisions etc"""
-        self.canvas.delete("all")
-        
-        # Create new obstacles
-            
-        # Using chunks
-        if self.run_mode == "Classic":
-            if self.chunk_tick < 0:
-                # Print level title
-                self.canvas.create_window(WINDOW_WIDTH/2,
-                                          WINDOW_HEIGHT/2,
-                                          width=WINDOW_WIDTH,
-                                          height=TITLE_HEIGHT,
-                                          window=Label(self.canvas, 
-                                                       fg=TITLE_FG,
-                                                       bg=TITLE_BG,
-                                                       font=TITLE_FONT,
-                                                       text=self.levels[self.current_level].title))
-            if self.chunk_tick == 0:
-                if self.levels[self.current_level].chunks_left():
-                    self.chunk = self.levels[self.current_level].next_chunk()
-                else:
-                    # Level is complete when all obstacles are off screen
-                    if len(self.obstacles) > 0:
-                        self.chunk_tick = -1
-                    else:
-                        # FINISHED!!
-                        
-                        # Unlocking next level
-                        if self.current_level == 19:
-                            self.complete = True
-                            self.finished_game = True
-                            # Finished whole game
-                            return self.main_screen()
-                        else:
-                            self.level_buttons[self.current_level + 1].unlocked = True
-                            self.complete = True
-                            
-                
-            if self.chunk_tick > 0 and self.chunk_tick in self.chunk.tick_signals.keys():
-                x_pos, y_pos, width, height = self.chunk.tick_signals[self.chunk_tick]
-                self.obstacles.append(Obstacle(x_pos, y_pos, width, height))
-            
-            # Allowing for title screen => not mod 250 if the chink tick is below zero
-            if self.chunk_tick >= 0:    
-                self.chunk_tick = (self.chunk_tick + 1) % 250
-            else:
-                self.chunk_tick += 1
+        """
+        Runs every tick, runs the simulation then creates and deletes canvas items
+        to match. Things are moved on the canvas by render, between ticks.
+        """
+        stats = self.frame_stats
+        if self.sim.run_mode == "Classic" and self.sim.showing_title and self.title_item is None:
+            self.show_title()
             
-        elif self.run_mode == "Endless":
-            if self.chunk_tick == 0:
-                self.chunk = self.easy_chunks[1]
+        if self.playback is not None:
+            keys = next(self.playback, None)
+            if keys is None:
+                # The recording ended without the run ending (Escape was pressed)
+                self.sim.dead = True
+                return
+            left, right = keys
+        else:
+            left, right = self.left, self.right
+            self.replay.record(left, right)
+        self.remember_state()
+        if stats is not None:
+            # Only the simulation is timed, from here to its first mark
+            stats.start_tick()
+        events = self.sim.step(left, right)
+        
+        spawned = []
+        for event, obstacle in events:
+            if event == SPAWNED:
+                spawned.append(obstacle)
+            elif event == REMOVED:
+                self.canvas.delete(self.obstacle_items.pop(obstacle))
+            elif event == DIED:
+                return self.collision_handler()
+            elif event == LEVEL_COMPLETE:
+                # Unlocking next level, playing back a replay does not count
+                if self.playback is None:
+                    self.level_buttons[self.sim.current_level + 1].unlocked = True
+            elif event == GAME_FINISHED:
+                # Finished whole game
+                if self.playback is None:
+                    self.finished_game = True
+                return self.main_screen()
+        
+        # If the title is being displayed, don't draw everything
+        if not self.sim.showing_title:
+            if self.title_item is not None:
+                self.canvas.delete(self.title_item)
+                self.title_item = None
+            if self.plane_item is None:
+                self.create_game_items()
+            for obstacle in spawned:
+                self.create_obstacle_item(obstacle)
                 
-            if self.chunk_tick in self.chunk.tick_signals.keys():
-                y_pos, width, height = self.chunk.tick_signals[self.chunk_tick]
-                self.obstacles.append(Obstacle(y_pos, width, height))
                 
-            self.chunk_tick = (self.chunk_tick + 1) % 250            
-        
-        
-        # If chunk_tick is below zero then the title is being displayed, don't draw everything
-        if self.chunk_tick >=0:
-            
-            # Move obstacles (left/right)
-            obstacles_to_delete = []
-            for obstacle in self.obstacles:
-                obstacle.x_pos -= MOVESPEED
-                if obstacle.x_pos + obstacle.width < 0:
-                    obstacles_to_delete.append(obstacle)
-                self.canvas.create_rectangle(obstacle.x_pos, obstacle.y_pos, obstacle.x_pos + obstacle.width, obstacle.y_pos + obstacle.height, fill=obstacle.color, width=0)
-                
-            for obstacle in obstacles_to_delete:
-                self.obstacles.remove(obstacle)
-            
-            # Set plane position to starting sin curve height 
-            # (sin curve calculation is correct, saves doing all the maths twice,
-            # and eliminates any mathematical errors/rounding errors etc.)
-            self.plane.y_pos = WINDOW_HEIGHT/2 + SIN_AMPLITUDE*math.sin(self.sin.angle)
+    def render(self, alpha):
+        """
+        Draws a frame, moving everything on the canvas to between where it was
+        before the last tick and where it is now. Called by the scheduler as often
+        as the machine can keep up with, so it must not change the simulation.
+        Keyword Arguments:
+            alpha -- how far between the two to draw, 0 to 1
+        """
+        if self.plane_item is None or self.sim.showing_title:
+            return
+        stats = self.frame_stats
+        if stats is not None:
+            stats.start_frame()
             
+        # Move obstacles (left/right), all at once using their tag
+        scroll = self.previous_scroll + (self.sim.obstacles.scroll - self.previous_scroll) * alpha
+        self.canvas.move("obstacle", self.drawn_scroll - scroll, 0)
+        self.drawn_scroll = scroll
+        if stats is not None:
+            stats.mark(DRAW_OBSTACLES_PHASE)
             
-            # Detect collisions
-            for obstacle in self.obstacles:
-                if obstacle.intersects_with(self.plane):
-                    self.collision_handler()
-                    return
+        # Moving the sin curve, the phase wraps round so the step is taken modulo a full turn
+        if self.sin_item is not None:
+            step = (self.sim.sin.phase - self.previous_phase) & SIN_PHASE_MASK
+            self.draw_sin((self.previous_phase + int(step * alpha)) & SIN_PHASE_MASK, QUALITY_SIN_STRIDES[self.quality.level])
+        if stats is not None:
+            stats.mark(DRAW_SIN_PHASE)
             
-            # Recalcculate sin line
-            self.calculate_sin()
-                
-            # Drawing the sin curve (after obstacles so it can be seen over the obstacles)
-            if self.current_level < 18: # Do not draw the sin wave for the last 2 levels
-                self.draw_sin()
-                
-            # Draw plane last so it is always on the top
-            self.canvas.create_rectangle(self.plane.x_pos - PLANE_WIDTH / 2, self.plane.y_pos - PLANE_WIDTH / 2, self.plane.x_pos + PLANE_WIDTH / 2, self.plane.y_pos + PLANE_WIDTH / 2, fill=self.plane.color)
+        # Moving the plane
+        plane = self.sim.plane
+        y_pos = self.previous_y + (plane.y_pos - self.previous_y) * alpha
+        self.canvas.coords(self.plane_item, plane.x_pos - PLANE_WIDTH / 2, y_pos - PLANE_WIDTH / 2, plane.x_pos + PLANE_WIDTH / 2, y_pos + PLANE_WIDTH / 2)
+        if stats is not None:
+            stats.mark(DRAW_PLANE_PHASE)
             
-        # Updates the canvas after everything has been calculated/moved    
-        self.canvas.update()
+            if self.show_hud and stats.frames.samples % HUD_REFRESH_FRAMES == 0:
+                self.update_hud()
+            # Redraws now rather than once the frame has finished, so the redraw can be timed
+            self.canvas.update_idletasks()
+            stats.mark(UPDATE_PHASE)
+            stats.end_frame()
         
         
-    def calculate_sin(self):
-        """Calculates the positions of the sin curve"""
-        # Recalcculate sin line
-        if self.right:
-            self.sin.period = self.sin.period * SIN_CHANGE_RATE
-        if self.left:
-            self.sin.period = self.sin.period / SIN_CHANGE_RATE
-
-       # Update sin angle
-        self.sin.angle = self.sin.angle + 2*math.pi*(MOVESPEED/self.sin.period)
-        if self.sin.angle > 2*math.pi:
-            self.sin.angle = self.sin.angle - 2*math.pi        
-        
-        
-    def draw_sin(self):
-        """Draws the sin curve, used for modularising the code"""
+    def show_title(self):
+        """Prints the level title in the middle of the screen"""
+        # A canvas item rather than a widget, so nothing is left behind when it is deleted
+        self.title_item = self.canvas.create_text(WINDOW_WIDTH/2, WINDOW_HEIGHT/2, width=WINDOW_WIDTH, justify=CENTER, fill=TITLE_FG, font=TITLE_FONT, text=self.sim.level.title)
         
-        # Max number of arguments in a function call is 255
-        # So splitting the line up into 4 parts to be drawn
-        # Actually 4 create line function calls, all having less than 255 arguments
         
-        xcoord = PLANE_STARTING_X
-        iterations = 1      
-            
-        for i in range(4):
-            temp_string = "self.canvas.create_line(PLANE_STARTING_X + {0} * SIN_PLOT_POINT_DISTANCE, WINDOW_HEIGHT/2 + SIN_AMPLITUDE*math.sin(self.sin.angle + {0} * SIN_PLOT_POINT_DISTANCE/self.sin.period*2*math.pi), ".format(iterations - 1)
-            
-            while xcoord < WINDOW_WIDTH/4 * (i + 1):
-                temp_string = temp_string + "PLANE_STARTING_X + {0} * SIN_PLOT_POINT_DISTANCE, WINDOW_HEIGHT/2 + SIN_AMPLITUDE*math.sin(self.sin.angle + {0} * SIN_PLOT_POINT_DISTANCE/self.sin.period*2*math.pi), ".format(iterations)
-                iterations += 1
-                xcoord += SIN_PLOT_POINT_DISTANCE
-                
-            temp_string = temp_string + "fill = SIN_COLOR)"
-            
-            eval(temp_string)         
+    def draw_sin(self, phase=None, stride=1):
+        """
+        Moves the sin curve line to the current wave, used for modularising the code
+        Keyword Arguments:
+            phase -- the phase to draw the wave at, the wave's own by default
+            stride -- draw every stride-th point only
+        """
+        self.canvas.coords(self.sin_item, self.sim.sin.plot_coords(phase, stride))
         
         
     def collision_handler(self):
         """Handles collisions between plane and obstacle"""
-        self.canvas.delete("all")
-        self.dead = True
+        self.reset_canvas_items()
     
     
     
@@ -556,30 +777,40 @@ def log(s):
 
 if __name__ == "__main__":
     """Run the program"""
-    # Initially create the level chunks and overall levels
-    log("Loading chunks")
-    t = time.time()
-    try:
-        easy, medium, hard = create_chunks()
-        log("Chunks loaded successfully")
-        log("Time taken: {}s".format(time.time() - t))
-    except Exception:
-        log("Error loading chunks")
+    parser = argparse.ArgumentParser(description="Sine Surfer")
+    parser.add_argument("--startup-report", action="store_true", help="print how long each part of starting up takes, then quit")
+    parser.add_argument("--replay", metavar="FILE", help="play back a recorded run")
+    parser.add_argument("--frame-stats", metavar="FILE", help="time every frame and save the timings to FILE on exit")
+    parser.add_argument("--fps", type=int, default=RENDER_MAX_FPS, help="most frames to draw a second, the game itself always runs at {} ticks a second (default: %(default)s)".format(TICKS_PER_SECOND))
+    args = parser.parse_args()
+    if args.fps < 1:
+        parser.error("--fps must be at least 1")
+    startup_times["Imports"] = IMPORTED - STARTED
     
-    log("Creating levels")
+    # Initially load the level chunks and overall levels
+    log("Loading levels")
     t = time.time()
     try:
-        levels = create_levels(easy, medium, hard)
-        log("Levels created successfully")
+        easy, medium, hard, levels = load_levels()
+        log("Levels loaded successfully")
         log("Time taken: {}s".format(time.time() - t))
-    except e:
-        log("Error creating levels: {}".format(e))
+    except Exception as e:
+        log("Error loading levels: {}".format(e))
+    startup_phase("Level data (chunk pools, level table)", t)
     
     # Initialize the Tk window
     log("Initializing window")
+    t = time.time()
     root = Tk()
     root.geometry("{}x{}+50+50".format(WINDOW_WIDTH, WINDOW_HEIGHT))
+    startup_phase("Tk initialization", t)
     
-    gui = GUI(root, easy, medium, hard, levels)
+    gui = GUI(root, easy, medium, hard, levels, startup_report=args.startup_report, frame_stats_path=args.frame_stats, max_fps=args.fps)
+    if args.replay:
+        try:
+            gui.play_replay(Replay.load(args.replay))
+        except (ValueError, OSError) as e:
+            # Stays on the main menu
+            log("Error loading replay: {}".format(e))
         
     root.mainloop()    
\ No newline at end of file
@@ -18,6 +18,20 @@ LOGGING = True
 
 MOVESPEED = 8
 
+TICKS_PER_SECOND = 25
+MAX_CATCH_UP_TICKS = 5 # Most ticks run back to back when the game falls behind
+RENDER_MAX_FPS = 60 # Frames are drawn between ticks up to this often
+RENDER_LOAD = 0.5 # Most of the time drawing frames can take before fewer are drawn
+
+# Drawing is cut back, one level at a time, when a tick and a frame take longer than a tick's time
+QUALITY_LEVEL_NAMES = ("full", "half sin points", "quarter sin points", "frame every other tick")
+QUALITY_SIN_STRIDES = (1, 2, 4, 4) # Draw every nth point of the sin wave at each level
+QUALITY_FRAME_TICKS = (1, 1, 1, 2) # Most ticks between frames at each level
+QUALITY_OVERRUN_LOAD = 0.8 # Cut back when a tick and a frame take more than this of a tick's time
+QUALITY_HEADROOM_LOAD = 0.4 # Restore when they take less than this
+QUALITY_SETTLE_TICKS = 10 # Fewest ticks between cutting back, so each level gets measured
+QUALITY_RESTORE_TICKS = 50 # Ticks of headroom before restoring a level
+
 PLANE_VELOCITY_MULTIPLIER = 9.65
 PLANE_WIDTH = 20
 PLANE_HEIGHT = 20
@@ -27,16 +41,59 @@ PLANE_COLOR = "red"
 SIN_AMPLITUDE = 250
 SIN_STARTING_PERIOD = 800
 SIN_CHANGE_RATE = 1.05
+# The period is always SIN_STARTING_PERIOD * SIN_CHANGE_RATE ** exponent
+SIN_MIN_EXPONENT = -40
+SIN_MAX_EXPONENT = 40
+SIN_PHASE_BITS = 32 # The phase is a whole number, 2**SIN_PHASE_BITS to a cycle
+SIN_TABLE_BITS = 14
+SIN_TABLE_SIZE = 1 << SIN_TABLE_BITS # Samples in one cycle
+SIN_FIXED_BITS = 16 # Heights in the table are rounded to 1/2**SIN_FIXED_BITS of a pixel
+SIN_TABLE_CACHE_SIZE = 32
 SIN_PLOT_POINT_DISTANCE = 5
 SIN_COLOR = "green"
 
 OBSTACLE_COLOR = "white"
 
-NUMBER_OF_LEVELS = 20
-
+CHUNK_TICKS = 250 # Length of a chunk that does not give its own (10 seconds)
+
+# Endless mode picks each chunk from the easy, medium and hard pools with these
+# weights, each row taking over once that many chunks have been played
+ENDLESS_RAMP = ((0, 1, 0, 0),
+                (3, 2, 1, 0),
+                (6, 1, 2, 0),
+                (9, 0, 2, 1),
+                (12, 0, 1, 1),
+                (18, 0, 1, 2))
+ENDLESS_PREFETCH = 1 # Chunks built ahead of the one being played
+LEVEL_DATA_PATH = "assets/levels/levels.json"
+LEVEL_CACHE_PATH = "assets/levels/levels.cache" # Compiled from LEVEL_DATA_PATH on first load
+LEVEL_CACHE_SIZE = 3 # Levels kept built (the one being played, the next and the last)
+CHUNK_CACHE_SIZE = 16
+
+FRAME_STATS_WINDOW = 250 # Frames the rolling timings cover (10 seconds)
+FRAME_STATS_PATH = "frame_stats.json" # Where the timings are saved on exit
+HUD_X = 10
+HUD_Y = 10
+HUD_FONT = ("Courier", 10)
+HUD_COLOR = "yellow"
+HUD_REFRESH_FRAMES = 5 # The HUD text is only changed every few frames
+
+REPLAY_DIR = "replays"
+REPLAY_KEEP = 50 # Most recent runs kept as replays
+
+PROFILE_ENV = "SINE_SURFER_PROFILE" # Set to profile the first run
+PROFILE_DIR = "profiles"
+PROFILE_TOP = 25 # Functions logged from each profile
+
+LOGO_PATH = "assets/images/sine_surfer_logo.png"
 LOGO_Y = 135
 LOGO_CLASSIC_Y = 135
 
+# The music is streamed from the first of these that exists
+MUSIC_PATHS = ("assets/music/sine_surfer_music.ogg", "assets/music/sine_surfer_music.wav")
+MUSIC_BUFFER_SIZE = 4096 # Samples in each buffer the mixer streams through
+ASSET_POLL_INTERVAL = 50 # ms between checks for the logo and music loading in the background
+
 # Start menu
 START_MENU_BUTTON_WIDTH = 200
 START_MENU_BUTTON_HEIGHT = 60
@@ -45,6 +102,7 @@ START_MENU_BUTTON_FONT = ("Times", 18)
 START_MENU_BUTTON_TEXT_COLOR = 'black'
 START_MENU_BUTTON_STARTING_Y_POS = 250
 START_MENU_BUTTON_SPACING = 80
+START_MENU_BUTTON_PAIR_OFFSET = 110 # Distance from the centre for buttons side by side
 
 # Classic menu
 CLASSIC_MENU_BUTTON_X = 67
@@ -75,4 +133,3 @@ HELP_LABEL_BG = "black"
 TITLE_FONT = ("Times", 60, "bold")
 TITLE_BG = "black"
 TITLE_FG = "white"
-TITLE_HEIGHT=200
\ No newline at end of file
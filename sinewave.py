@@ -0,0 +1,174 @@
+"""
+The sin wave that the plane follows, and the maths for plotting it
+
+The wave's phase is a whole number that wraps at SIN_PHASE_ONE, and heights
+are looked up in SIN_TABLE rather than worked out with math.sin, so the plane
+ends up at exactly the same heights for the same inputs on every machine and
+however long a run goes on.
+"""
+
+import math
+from functools import lru_cache
+
+from sineplane_constants import *
+
+SIN_PHASE_ONE = 1 << SIN_PHASE_BITS # One full cycle
+SIN_PHASE_MASK = SIN_PHASE_ONE - 1
+SIN_TABLE_SHIFT = SIN_PHASE_BITS - SIN_TABLE_BITS # Phase to SIN_TABLE index
+
+# x coordinates of every plotted point, from the plane to the right edge of the window
+SIN_PLOT_XS = [PLANE_STARTING_X + i * SIN_PLOT_POINT_DISTANCE
+               for i in range(math.ceil((WINDOW_WIDTH - PLANE_STARTING_X) / SIN_PLOT_POINT_DISTANCE) + 1)]
+
+
+def build_sin_table():
+    """
+    Returns the screen heights of one full cycle of the wave (0 -> SIN_TABLE_SIZE is 0 -> 2pi).
+    
+    The heights are rounded to 1/2**SIN_FIXED_BITS of a pixel, so a last bit
+    difference between maths libraries does not change them. Only the first
+    quarter of the cycle is worked out, the rest is a mirror of it.
+    """
+    quarter = SIN_TABLE_SIZE // 4
+    scale = SIN_AMPLITUDE << SIN_FIXED_BITS
+    rise = [round(scale * math.sin(2 * math.pi * i / SIN_TABLE_SIZE)) for i in range(quarter + 1)]
+    half = rise + rise[-2:0:-1]
+    return [WINDOW_HEIGHT / 2 + value / (1 << SIN_FIXED_BITS) for value in half + [-value for value in half]]
+
+
+SIN_TABLE = build_sin_table()
+
+
+class WaveTable:
+    """Everything about the wave that only depends on the period exponent"""
+    def __init__(self, exponent):
+        self.period = SIN_STARTING_PERIOD * SIN_CHANGE_RATE ** exponent
+        
+        # Phase moved through each tick, MOVESPEED / period of a cycle. Worked out
+        # in whole numbers rather than floats, so it is the same on every machine.
+        numerator, denominator = SIN_CHANGE_RATE.as_integer_ratio()
+        if exponent < 0:
+            numerator, denominator = denominator, numerator
+        top = MOVESPEED * SIN_PHASE_ONE * denominator ** abs(exponent)
+        bottom = SIN_STARTING_PERIOD * numerator ** abs(exponent)
+        self.phase_increment = (2 * top + bottom) // (2 * bottom)
+        
+        # The same as an angle in radians
+        self.phase_step = 2 * math.pi * self.phase_increment / SIN_PHASE_ONE
+        
+        # Offset into SIN_TABLE of each plotted point, relative to the plane
+        self.point_offsets = [round(i * SIN_PLOT_POINT_DISTANCE / self.period * SIN_TABLE_SIZE)
+                              for i in range(len(SIN_PLOT_XS))]
+        
+        # (xs, offsets) of the plotted points for each stride asked for
+        self.strided_points = {1: (SIN_PLOT_XS, self.point_offsets)}
+        
+    def points(self, stride):
+        """
+        Returns the x coordinates and SIN_TABLE offsets of every stride-th plotted
+        point, always keeping the last so the wave still reaches the edge of the window
+        Keyword Arguments:
+            stride -- how many points along to take each point, 1 for all of them
+        """
+        points = self.strided_points.get(stride)
+        if points is None:
+            indexes = list(range(0, len(SIN_PLOT_XS) - 1, stride)) + [len(SIN_PLOT_XS) - 1]
+            points = ([SIN_PLOT_XS[i] for i in indexes], [self.point_offsets[i] for i in indexes])
+            self.strided_points[stride] = points
+        return points
+        
+        
+@lru_cache(maxsize=SIN_TABLE_CACHE_SIZE)
+def wave_table(exponent):
+    """
+    Returns the (cached) WaveTable for a period exponent
+    Keyword Arguments:
+        exponent -- the period exponent, see SinWave
+    """
+    return WaveTable(exponent)
+
+
+class SinWave:
+    """
+    The sin wave showing trajectory
+    
+    The period is only ever changed by a factor of SIN_CHANGE_RATE, so it is stored
+    as the whole number exponent instead of a float that drifts as it is multiplied
+    and divided.
+    """
+    def __init__(self):
+        self.phase = 0
+        self.exponent = 0
+        
+    @property
+    def angle(self):
+        """The phase as an angle in radians"""
+        return self.phase * 2 * math.pi / SIN_PHASE_ONE
+    
+    @property
+    def height(self):
+        """The screen height of the wave at the plane"""
+        return SIN_TABLE[self.phase >> SIN_TABLE_SHIFT]
+    
+    @property
+    def period(self):
+        return wave_table(self.exponent).period
+    
+    @property
+    def phase_step(self):
+        return wave_table(self.exponent).phase_step
+    
+    def change_period(self, steps):
+        """
+        Stretches (positive steps) or squashes (negative steps) the wave
+        Keyword Arguments:
+            steps -- the number of SIN_CHANGE_RATE steps to change the period by
+        """
+        self.exponent = max(SIN_MIN_EXPONENT, min(SIN_MAX_EXPONENT, self.exponent + steps))
+        
+    def advance(self):
+        """Moves the wave on by a tick"""
+        self.phase = (self.phase + wave_table(self.exponent).phase_increment) & SIN_PHASE_MASK
+        
+    def hold(self, ticks, steps=0):
+        """
+        Moves the wave on by a number of ticks, changing the period every tick
+        like holding a key, and returns the phase at the start of each tick
+        Keyword Arguments:
+            ticks -- the number of ticks to move on by
+            steps -- the SIN_CHANGE_RATE steps to change the period by each tick, 0 for no key
+        """
+        if steps == 0:
+            # Nothing changes the phase step, so every phase is known straight away
+            start = self.phase
+            increment = wave_table(self.exponent).phase_increment
+            self.phase = (start + ticks * increment) & SIN_PHASE_MASK
+            return [(start + i * increment) & SIN_PHASE_MASK for i in range(ticks)]
+        
+        phases = []
+        for i in range(ticks):
+            phases.append(self.phase)
+            self.change_period(steps)
+            self.advance()
+        return phases
+        
+    def plot_coords(self, phase=None, stride=1):
+        """
+        Returns the flat list of x, y coordinates for drawing the wave as one line.
+        
+        Every point is looked up in SIN_TABLE, rotated by the current phase, so no
+        trigonometry is done while drawing.
+        Keyword Arguments:
+            phase -- the phase to draw at instead of the current one, for drawing between ticks
+            stride -- plot every stride-th point only, for a coarser but quicker line
+        """
+        if phase is None:
+            phase = self.phase
+        base = phase >> SIN_TABLE_SHIFT
+        mask = SIN_TABLE_SIZE - 1
+        
+        coords = []
+        for x, offset in zip(*wave_table(self.exponent).points(stride)):
+            coords.append(x)
+            coords.append(SIN_TABLE[(base + offset) & mask])
+        return coords
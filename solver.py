@@ -0,0 +1,395 @@
+"""
+Finds the fewest key presses needed to clear each level (its par)
+
+Run with: python solver.py [--cache FILE] [--routes DIR] [level numbers...]
+
+Builds on verify_levels.py. Working backwards from the end of a level, the
+cost to go (the fewest ticks a key has to be held to finish from there) is
+worked out for every period exponent as a function of the angle. The cost
+changes at a limited number of angles, so each function is kept as a list of
+the angles where it changes and the cost after each one, rather than as a
+fixed grid of angle buckets. Costs above a cap are dropped, which keeps those
+lists short. The cap starts low and is raised until the level can be cleared.
+
+The cost functions at the start of every chunk are saved to a cache file,
+keyed by everything that happens from there to the end of the level. Levels
+that end the same way share them, and after a chunk is edited only the chunks
+up to it are worked out again. Finished routes are cached by the whole level
+the same way, so "Driving Blind" reuses the route for "Predictable".
+
+Each route is written to its own file as run length encoded inputs for every
+tick, for example "52N 3L 40N 2R ..." (N is no key, L left, R right).
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import time
+from bisect import bisect_right
+
+from verify_levels import *
+
+INF = float("inf")
+
+# Extra pixels kept between the plane and obstacles, so routes do not rely on
+# skimming an obstacle by a rounding error
+SOLVER_PADDING = 0.5
+
+# Anything that changes the answers, the cache is thrown away if it changes
+SOLVER_SETTINGS = repr((MOVESPEED, PLANE_STARTING_X, PLANE_WIDTH, PLANE_HEIGHT, SIN_AMPLITUDE,
+                        SIN_STARTING_PERIOD, SIN_CHANGE_RATE, SIN_MIN_EXPONENT, SIN_MAX_EXPONENT,
+                        WINDOW_HEIGHT, SOLVER_PADDING))
+
+INPUT_LETTERS = {NONE: "N", LEFT: "L", RIGHT: "R"}
+
+# The first cap on costs tried, see par_route
+START_CAP = 4
+
+# Pieces of a cost function thinner than this (in radians) are merged into
+# a neighbour, about a hundredth of a pixel at the steepest part of the wave
+MIN_PIECE = 5e-5
+
+# The cost to go from every angle when the level is over
+FINISHED = {k: ([0.0], [0]) for k in EXPONENTS}
+
+
+def level_segments(sim, level_index):
+    """
+    Runs a level with no collisions, returning its timeline (see level_timeline)
+    and the tick each chunk starts on
+    Keyword Arguments:
+        sim -- a TimelineSimulation with the game's chunks and levels
+        level_index -- the index of the level in levels
+    """
+    sim.start_level(level_index)
+    timeline = []
+    chunk_starts = []
+    chunk = None
+    while not sim.complete:
+        sim.zones = None
+        sim.step(False, False)
+        if sim.chunk is not chunk:
+            chunk = sim.chunk
+            chunk_starts.append(len(timeline))
+        timeline.append(sim.zones)
+    return timeline, chunk_starts
+
+
+def suffix_keys(timeline):
+    """
+    Returns a key for every tick of a timeline that only depends on what happens
+    from that tick to the end (and the solver settings)
+    Keyword Arguments:
+        timeline -- the level timeline
+    """
+    keys = [None] * (len(timeline) + 1)
+    key = hashlib.sha1(SOLVER_SETTINGS.encode()).hexdigest()
+    keys[-1] = key
+    for tick in range(len(timeline) - 1, -1, -1):
+        key = hashlib.sha1((repr(timeline[tick]) + key).encode()).hexdigest()
+        keys[tick] = key
+    return keys
+
+
+def padded(zones):
+    """Grows the deadly zones by SOLVER_PADDING"""
+    return tuple((top - SOLVER_PADDING, bottom + SOLVER_PADDING) for top, bottom in zones)
+
+
+def cost_at(function, angle):
+    """
+    Returns the value of a cost function at an angle
+    Keyword Arguments:
+        function -- (angles, costs), the cost is costs[i] from angles[i] up to the next angle
+        angle -- an angle from 0 to 2pi
+    """
+    angles, costs = function
+    return costs[bisect_right(angles, angle) - 1]
+
+
+def rotate(function, amount):
+    """
+    Returns the cost function g(angle) = f(angle + amount)
+    Keyword Arguments:
+        function -- the cost function f
+        amount -- the angle to move by, from 0 to 2pi
+    """
+    angles, costs = function
+    moved = [(angle - amount) % TWO_PI for angle in angles]
+
+    # The moved angles are in order apart from one wrap past 0
+    start = min(range(len(moved)), key=moved.__getitem__)
+    moved = moved[start:] + moved[:start]
+    costs = costs[start:] + costs[:start]
+    if moved[0] != 0:
+        moved.insert(0, 0.0)
+        costs.insert(0, costs[-1])
+    return moved, costs
+
+
+def safe_function(intervals):
+    """
+    Returns a cost function that is 0 on a list of angle intervals and INF elsewhere
+    Keyword Arguments:
+        intervals -- the sorted, merged intervals
+    """
+    angles, costs = [0.0], [INF]
+    for start, end in intervals:
+        if start == angles[-1]:
+            costs[-1] = 0
+        else:
+            angles.append(start)
+            costs.append(0)
+        if end < TWO_PI:
+            angles.append(end)
+            costs.append(INF)
+    return angles, costs
+
+
+def combine(options, safe, cap):
+    """
+    Returns the cheapest of several cost functions, INF wherever safe is INF
+    Keyword Arguments:
+        options -- a list of (cost function, cost added) pairs
+        safe -- a cost function from safe_function
+        cap -- costs above this are treated as INF
+    """
+    functions = [function for function, added in options] + [safe]
+    added = [added for function, added in options]
+
+    angles = sorted(set(angle for function in functions for angle in function[0]))
+    positions = [0] * len(functions)
+
+    result_angles, result_costs = [], []
+    for angle in angles:
+        values = []
+        for i, (function_angles, function_costs) in enumerate(functions):
+            position = positions[i]
+            while position + 1 < len(function_angles) and function_angles[position + 1] <= angle:
+                position += 1
+            positions[i] = position
+            values.append(function_costs[position])
+
+        if values[-1] == INF:
+            cost = INF
+        else:
+            cost = min(value + extra for value, extra in zip(values, added))
+            if cost > cap:
+                cost = INF
+
+        if not result_costs or result_costs[-1] != cost:
+            # A sliver too thin to matter is taken over by a neighbour that costs
+            # at least as much, so the function never promises a cheaper route than there is
+            if result_costs and angle - result_angles[-1] < MIN_PIECE:
+                if result_costs[-1] <= cost:
+                    angle = result_angles.pop()
+                    result_costs.pop()
+                elif len(result_costs) > 1 and result_costs[-1] <= result_costs[-2]:
+                    result_angles.pop()
+                    result_costs.pop()
+                if result_costs and result_costs[-1] == cost:
+                    continue
+            result_angles.append(angle)
+            result_costs.append(cost)
+    return result_angles, result_costs
+
+
+def exponent_budgets(exponent, cap):
+    """
+    Returns the most a route can still spend from each exponent it could reach.
+    Getting from the starting exponent to another one costs at least one key
+    tick per step, so far away exponents are never worth working out.
+    Keyword Arguments:
+        exponent -- the starting exponent
+        cap -- the most a route can cost
+    """
+    return {k: cap - abs(k - exponent) for k in EXPONENTS if abs(k - exponent) <= cap}
+
+
+def step_back(after, zones, budgets):
+    """
+    Returns the cost functions one tick earlier
+    Keyword Arguments:
+        after -- the cost function for each exponent after the tick
+        zones -- the deadly zones on the tick, None if the plane is not checked
+        budgets -- costs above these (for each exponent) are treated as INF
+    """
+    if zones is None:
+        return after
+
+    safe = safe_function(safe_angles(padded(zones)))
+    moved = {k: rotate(after[k], PHASE_STEPS[k]) for k in budgets}
+
+    before = {}
+    for k, budget in budgets.items():
+        options = [(moved[k], 0)]
+        for change in (LEFT, RIGHT):
+            new_k = clamp_exponent(k + change)
+            if new_k != k and new_k in budgets:
+                options.append((moved[new_k], 1))
+        before[k] = combine(options, safe, budget)
+    return before
+
+
+def solve_segment(timeline, start, end, at_end, budgets):
+    """
+    Works out the cost functions for every tick from start up to end
+    Keyword Arguments:
+        timeline -- the level timeline
+        start, end -- the ticks to work out
+        at_end -- the cost functions at the end tick
+        budgets -- as returned by exponent_budgets
+    """
+    functions = [at_end]
+    for tick in range(end - 1, start - 1, -1):
+        functions.append(step_back(functions[-1], timeline[tick], budgets))
+    functions.reverse()
+    return functions
+
+
+def par_route(timeline, chunk_starts, exponent, angle, cache):
+    """
+    Returns (the fewest key ticks needed, the input for every tick) for a
+    level, or (INF, None) if it can not be cleared
+    Keyword Arguments:
+        timeline, chunk_starts -- as returned by level_segments
+        exponent, angle -- the state of the sin wave at the start
+        cache -- dict of cached results, updated with new ones
+    """
+    keys = suffix_keys(timeline)
+    level_key = (keys[0], exponent, angle)
+    if level_key in cache:
+        return cache[level_key]
+
+    # Keeping the costs capped keeps the cost functions small, so start with a
+    # low cap and raise it until the start is reachable. Any run found by the
+    # verifier is an upper bound for the cap.
+    run = find_run(timeline, search(timeline), exponent, angle)
+    if run is None:
+        cache[level_key] = (INF, None)
+        return cache[level_key]
+    most = sum(change != NONE for change in run)
+
+    boundaries = sorted(set(chunk_starts + [0])) + [len(timeline)]
+    cap = min(START_CAP, most)
+    while True:
+        budgets = exponent_budgets(exponent, cap)
+        
+        # Cost functions at every chunk start (and the end), from the cache where possible
+        checkpoints = {len(timeline): FINISHED}
+        for start, end in zip(reversed(boundaries[:-1]), reversed(boundaries[1:])):
+            cached = cache.get(keys[start])
+            if cached is None or cached[0] != exponent or cached[1] < cap:
+                cached = (exponent, cap, solve_segment(timeline, start, end, checkpoints[end], budgets)[0])
+                cache[keys[start]] = cached
+            checkpoints[start] = cached[2]
+
+        par = cost_at(checkpoints[0][exponent], angle)
+        if par <= cap:
+            break
+        cap = min(cap * 2, most)
+
+    # Follow the cost functions forwards one chunk at a time, only holding a key when it has to be
+    inputs = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        functions = solve_segment(timeline, start, end, checkpoints[end], budgets)
+        for tick in range(start, end):
+            if timeline[tick] is None:
+                inputs.append(NONE)
+                continue
+            best = None
+            for change in (NONE, LEFT, RIGHT):
+                new_k = clamp_exponent(exponent + change)
+                if new_k not in budgets:
+                    continue
+                new_angle = (angle + PHASE_STEPS[new_k]) % TWO_PI
+                total = cost_at(functions[tick - start + 1][new_k], new_angle) + (change != NONE)
+                if best is None or total < best[0]:
+                    best = (total, change, new_k, new_angle)
+            total, change, exponent, angle = best
+            inputs.append(change)
+
+    cache[level_key] = (par, inputs)
+    return cache[level_key]
+
+
+def encode_route(inputs):
+    """
+    Run length encodes a list of inputs, e.g. "52N 3L 40N"
+    Keyword Arguments:
+        inputs -- the input for every tick
+    """
+    runs = []
+    for change in inputs:
+        if runs and runs[-1][1] == change:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, change])
+    return " ".join("{}{}".format(count, INPUT_LETTERS[change]) for count, change in runs)
+
+
+def load_cache(path):
+    """Loads the solver cache, or returns an empty one"""
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def save_cache(path, cache):
+    """Saves the solver cache"""
+    with open(path, "wb") as file:
+        pickle.dump(cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finds the fewest key presses needed to clear each level")
+    parser.add_argument("levels", nargs="*", type=int, help="level numbers to solve (default: all)")
+    parser.add_argument("--cache", default="solver_cache.pickle", help="cache file (default: %(default)s)")
+    parser.add_argument("--routes", default="routes", help="folder to write the routes to (default: %(default)s)")
+    args = parser.parse_args()
+
+    easy, medium, hard, levels = load_levels()
+    if any(not 1 <= n <= len(levels) for n in args.levels):
+        parser.error("there are only {} levels".format(len(levels)))
+    level_numbers = args.levels or range(1, len(levels) + 1)
+    cache = load_cache(args.cache)
+    os.makedirs(args.routes, exist_ok=True)
+
+    t = time.time()
+    all_solved = True
+    for level_number in level_numbers:
+        level_t = time.time()
+        level_index = level_number - 1
+        timeline, chunk_starts = level_segments(TimelineSimulation(easy, medium, hard, levels), level_index)
+
+        # Routes start from a fresh game's sin wave
+        sim = Simulation(easy, medium, hard, levels)
+        sim.start_level(level_index)
+        par, inputs = par_route(timeline, chunk_starts, sim.sin.exponent, sim.sin.angle, cache)
+
+        title = levels[level_index].title
+        if inputs is None:
+            result = "UNSOLVABLE"
+            all_solved = False
+        else:
+            confirmed = replay(Simulation(easy, medium, hard, levels), level_index, inputs)
+            result = "par {:3} key ticks".format(par) if confirmed else "par {} (replay FAILED)".format(par)
+            all_solved = all_solved and confirmed
+
+            with open(os.path.join(args.routes, "{:02}.route".format(level_number)), "w") as file:
+                file.write("# {}: {}\n# par {} key ticks\n{}\n".format(level_number, title, par, encode_route(inputs)))
+
+        print("{:2} {:24} {:26} {:.2f}s".format(level_number, title, result, time.time() - level_t))
+
+        # Saved as it goes, so an interrupted run still speeds up the next one
+        save_cache(args.cache, cache)
+
+    print("Total time: {:.2f}s".format(time.time() - t))
+    return 0 if all_solved else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
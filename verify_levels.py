@@ -0,0 +1,339 @@
+"""
+Checks that every level can be survived
+
+Run with: python verify_levels.py [--workers N] [level numbers...]
+
+Nothing the player does changes where the obstacles are, so each level is
+first run once to record which heights are deadly on each tick (its timeline).
+The player only controls the sin wave, whose state is the period exponent and
+the angle. Working backwards from the end of the level, the states that can
+still survive are kept as a list of angle intervals for every exponent. This
+is exact and merges every equivalent state into one, so the search stays at a
+handful of intervals per exponent instead of growing with every input.
+
+A level is solvable if the starting state is in those sets. A run through it
+is then found and replayed through the real Simulation to confirm it.
+
+Each level is checked in its own process.
+"""
+
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from simulation import *
+from sinewave import wave_table
+
+TWO_PI = 2 * math.pi
+
+# Inputs, as a change in the period exponent
+NONE = 0
+LEFT = -1
+RIGHT = 1
+INPUTS = (LEFT, NONE, RIGHT)
+
+EXPONENTS = range(SIN_MIN_EXPONENT, SIN_MAX_EXPONENT + 1)
+
+# Angle moved each tick for every period exponent (looked up far too often to go through the wave_table cache)
+PHASE_STEPS = {k: wave_table(k).phase_step for k in EXPONENTS}
+
+# How far (in radians) inside the viable angles a run has to stay to not press a key
+SAFE_MARGIN = 0.05
+
+
+class TimelineSimulation(Simulation):
+    """
+    A simulation where the plane can not die, which records the deadly heights
+    instead of checking for collisions.
+    """
+    def find_collision(self):
+        # The plane's centre can not be strictly between top and bottom
+        self.zones = tuple(sorted((obstacle.y_pos - PLANE_HEIGHT / 2, obstacle.y_pos + obstacle.height + PLANE_HEIGHT / 2)
+                                  for obstacle in self.obstacles_at_plane()))
+        return None
+    
+    
+def level_timeline(sim, level_index):
+    """
+    Runs a level with no collisions and returns the deadly heights for every tick,
+    None for the ticks where the plane is not checked (the title)
+    Keyword Arguments:
+        sim -- a TimelineSimulation with the game's chunks and levels
+        level_index -- the index of the level in levels
+    """
+    sim.start_level(level_index)
+    timeline = []
+    while not sim.complete:
+        sim.zones = None
+        sim.step(False, False)
+        timeline.append(sim.zones)
+    return timeline
+
+
+def merge(intervals):
+    """
+    Sorts a list of (start, end) intervals and joins the ones that overlap
+    Keyword Arguments:
+        intervals -- the intervals to merge
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intersect(a, b):
+    """
+    Returns the intersection of two sorted, merged interval lists
+    Keyword Arguments:
+        a, b -- the interval lists
+    """
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start <= end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def complement(intervals):
+    """
+    Returns the angles in 0 -> 2pi that are not in a sorted, merged interval list
+    Keyword Arguments:
+        intervals -- the interval list
+    """
+    result = []
+    position = 0
+    for start, end in intervals:
+        if start > position:
+            result.append((position, start))
+        position = max(position, end)
+    if position < TWO_PI:
+        result.append((position, TWO_PI))
+    return result
+
+
+def shift(intervals, amount):
+    """
+    Moves a list of angle intervals round the circle, splitting any that wrap past 2pi
+    Keyword Arguments:
+        intervals -- the interval list
+        amount -- the angle to add, less than 2pi
+    """
+    result = []
+    for start, end in intervals:
+        start += amount
+        end += amount
+        if start >= TWO_PI:
+            result.append((start - TWO_PI, end - TWO_PI))
+        elif end > TWO_PI:
+            result.append((start, TWO_PI))
+            result.append((0, end - TWO_PI))
+        else:
+            result.append((start, end))
+    return result
+
+
+def above(height):
+    """
+    Returns the angles where the plane is at or below (on screen) the given height
+    Keyword Arguments:
+        height -- the screen y position
+    """
+    s = (height - WINDOW_HEIGHT / 2) / SIN_AMPLITUDE
+    if s <= -1:
+        return [(0, TWO_PI)]
+    if s > 1:
+        return []
+    a = math.asin(s)
+    if a >= 0:
+        return [(a, math.pi - a)]
+    return [(0, math.pi - a), (TWO_PI + a, TWO_PI)]
+
+
+@lru_cache(maxsize=None)
+def safe_angles(zones):
+    """
+    Returns the angles where the plane is outside all the deadly zones
+    Keyword Arguments:
+        zones -- the (top, bottom) zones the plane's centre must stay out of
+    """
+    safe = [(0, TWO_PI)]
+    for top, bottom in zones:
+        outside = merge(complement(above(top)) + above(bottom))
+        safe = intersect(safe, outside)
+    return safe
+
+
+def margin(intervals, angle):
+    """
+    Returns how far an angle is inside an interval list, negative if it is outside
+    Keyword Arguments:
+        intervals -- the interval list
+        angle -- the angle to check
+    """
+    best = -TWO_PI
+    for start, end in intervals:
+        best = max(best, min(angle - start, end - angle))
+    return best
+
+
+def clamp_exponent(exponent):
+    """Limits a period exponent the same way SinWave.change_period does"""
+    return max(SIN_MIN_EXPONENT, min(SIN_MAX_EXPONENT, exponent))
+
+
+def search(timeline):
+    """
+    Works backwards from the end of a timeline to find the states the level can
+    still be survived from. Returns a list with a dict of exponent -> angle
+    intervals for each tick (before that tick's collision check), plus one for
+    after the last tick.
+    
+    Starting from every state being fine at the end, the sets only ever get cut
+    down by the safe angles, so they stay as a handful of intervals.
+    Keyword Arguments:
+        timeline -- the level timeline
+    """
+    states = {k: [(0, TWO_PI)] for k in EXPONENTS}
+    viable = [states]
+    for zones in reversed(timeline):
+        if zones is not None:
+            # Angles that lead to a viable state after any of the inputs
+            before_move = {}
+            for k in EXPONENTS:
+                before_move[k] = shift(states[k], TWO_PI - PHASE_STEPS[k])
+            
+            safe = safe_angles(zones)
+            states = {}
+            for k in EXPONENTS:
+                intervals = []
+                for change in INPUTS:
+                    intervals.extend(before_move[clamp_exponent(k + change)])
+                states[k] = intersect(merge(intervals), safe)
+        viable.append(states)
+    viable.reverse()
+    return viable
+
+
+def find_run(timeline, viable, exponent, angle):
+    """
+    Returns the input for every tick of a run through a timeline, keeping to the
+    viable states (holding no key whenever that is safe), or None if the start is not viable
+    Keyword Arguments:
+        timeline, viable -- as used and returned by search
+        exponent, angle -- the state of the sin wave at the start
+    """
+    if margin(viable[0][exponent], angle) < 0:
+        return None
+    
+    inputs = []
+    for zones, next_states in zip(timeline, viable[1:]):
+        if zones is None:
+            inputs.append(NONE)
+            continue
+        
+        # No key if that stays comfortably inside the viable states, otherwise
+        # whichever input keeps furthest inside them
+        best = None
+        for change in (NONE, LEFT, RIGHT):
+            new_k = clamp_exponent(exponent + change)
+            new_angle = (angle + PHASE_STEPS[new_k]) % TWO_PI
+            distance = margin(next_states[new_k], new_angle)
+            if best is None or distance > best[0]:
+                best = (distance, change, new_k, new_angle)
+            if change == NONE and distance >= SAFE_MARGIN:
+                break
+        distance, change, exponent, angle = best
+        inputs.append(change)
+    return inputs
+
+
+def replay(sim, level_index, inputs):
+    """
+    Plays a level with a list of inputs and returns True if it was completed
+    Keyword Arguments:
+        sim -- a Simulation with the game's chunks and levels
+        level_index -- the index of the level in levels
+        inputs -- the input for each tick
+    """
+    sim.start_level(level_index)
+    for change in inputs:
+        sim.step(change == LEFT, change == RIGHT)
+        if sim.dead or sim.complete:
+            break
+    return sim.complete and not sim.dead
+
+
+def verify_level(level_index):
+    """
+    Searches a level for a run that survives it. Returns a tuple of
+    (level index, title, solvable, replay confirmed, fraction of starting angles
+    that can be survived from, seconds taken)
+    Keyword Arguments:
+        level_index -- the index of the level in the levels
+    """
+    t = time.time()
+    easy, medium, hard, levels = load_levels()
+    
+    sim = TimelineSimulation(easy, medium, hard, levels)
+    timeline = level_timeline(sim, level_index)
+    
+    viable = search(timeline)
+    
+    sim = Simulation(easy, medium, hard, levels)
+    sim.start_level(level_index)
+    
+    # The sin wave angle carries on from the last game, so see how many of the
+    # starting angles the level can be survived from
+    coverage = sum(end - start for start, end in viable[0][sim.sin.exponent]) / TWO_PI
+    
+    # Find and replay a run from a fresh game's starting angle
+    inputs = find_run(timeline, viable, sim.sin.exponent, sim.sin.angle)
+    
+    solvable = inputs is not None
+    confirmed = solvable and replay(Simulation(easy, medium, hard, levels), level_index, inputs)
+        
+    return level_index, levels[level_index].title, solvable, confirmed, coverage, time.time() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that every level can be survived")
+    parser.add_argument("levels", nargs="*", type=int, help="level numbers to check (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: one per CPU)")
+    args = parser.parse_args()
+    
+    t = time.time()
+    # Brings the level cache up to date before the workers start, so they only map it
+    levels = load_levels()[3]
+    if any(not 1 <= n <= len(levels) for n in args.levels):
+        parser.error("there are only {} levels".format(len(levels)))
+    level_numbers = args.levels or range(1, len(levels) + 1)
+    all_solvable = True
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for level_index, title, solvable, confirmed, coverage, taken in pool.map(verify_level, [n - 1 for n in level_numbers]):
+            if solvable:
+                result = "solvable" if confirmed else "solvable (replay FAILED)"
+            else:
+                result = "UNSOLVABLE"
+            print("{:2} {:24} {:26} {:4.0%} of start angles  {:.2f}s".format(level_index + 1, title, result, coverage, taken))
+            all_solvable = all_solvable and solvable and confirmed
+            
+    print("Total time: {:.2f}s".format(time.time() - t))
+    return 0 if all_solvable else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())